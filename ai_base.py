@@ -42,6 +42,9 @@ class ParamDescr(object):
 class AIBase(object):
     """Configure from the config object and provide basic __call__."""
 
+    #: Keyword arguments for the ``TronGrid`` that the client makes for us.
+    grid_options = {}
+
     def __init__(self):
         super(AIBase, self).__init__()
 
@@ -36,6 +36,11 @@ class AICrosser(AIWanderer):
                 help='Available space to decide that we\'re in a pocket.')
         self.add_param('ray_width', 'w', help='Width of the ray scan.')
 
+    @property
+    def grid_options(self):
+        """Keep the free run lengths in the grid for the straight rays."""
+        return {'run_lengths': self.ray_width == 0}
+
     OPEN = 0
     POCKET = 1
     LONELY = 2
@@ -67,18 +72,25 @@ class AICrosser(AIWanderer):
         if self.grid[new_pos] != 0:
             return False
 
-        pr = self.grid.bfs_probe(new_pos, limit=self.depth_limit)
+        pr = self.grid.bfs_probe(new_pos, limit=self.depth_limit, lean=True)
         threshold = self.full_bfs.empty_count * self.claustrophobia / 100.0
         return pr.empty_count > threshold
 
     def choose_direction(self):
         """Look for good straight directions."""
         options = {}
-        for dir, offset in self.grid.DIRECTIONS.items():
-            pr = self.grid.ray_probe(self.my_pos, offset, self.ray_width)
-            weight = pr.max_distance
-            weight += pr.closest_obstacle_d * 3
-            options[weight] = dir
+        if self.ray_width == 0:
+            # Straight rays just run to the first obstacle.
+            for dir, offset in self.grid.DIRECTIONS.items():
+                run = self.grid.free_run(self.my_pos, offset)
+                options[run + (run + 1) * 3] = dir
+        else:
+            rays = self.grid.ray_probe_all(self.my_pos, self.ray_width)
+            for dir in self.grid.DIRECTIONS:
+                pr = rays[dir]
+                weight = pr.max_distance
+                weight += pr.closest_obstacle_d * 3
+                options[weight] = dir
 
         self.direction = options[max(options)]
 
@@ -43,11 +43,12 @@ class AIGBase(AIBase):
                 return (0, 0, 0, 100, 0, 100)
         return (0, 0, 0, 100, 100, 0)
 
-    def calc_vars(self, direction):
+    def calc_vars(self, direction, bfs=None):
         """Calculate decisions variables for a given direction.
 
         Performs a ray probe with width = 10 and a bfs probe in the given
-        direction and returns a tuple with the following items:
+        direction (unless ``bfs`` is passed) and returns a tuple with the
+        following items:
 
         0. ray_max_distance,
         1. ray_closest_obstacle_d,
@@ -68,7 +69,8 @@ class AIGBase(AIBase):
             return self.vars_from_value(value) * 2
         else:
             ray = self.grid.ray_probe(self.my_pos, offset, width=10)
-            bfs = self.grid.bfs_probe(self.my_pos + offset)
+            if bfs is None:
+                bfs = self.grid.bfs_probe(self.my_pos + offset)
             return self.vars_from_probe(ray) + self.vars_from_probe(bfs)
 
     def go(self):
@@ -86,16 +88,25 @@ class AIGBase(AIBase):
             straight = self.last_move
             right = directions[(last_index + 1) % 4]
 
-            full_bfs = self.grid.bfs_probe(self.my_pos)
+            # Only the empty neighbours are probed, calc_vars doesn't need
+            # the probes of the others.
+            offsets = self.grid.DIRECTIONS
+            empty = [d for d in (left, straight, right)
+                    if self.grid[self.my_pos + offsets[d]] == 0]
+            probes = self.grid.bfs_probe_many([self.my_pos] +
+                    [self.my_pos + offsets[d] for d in empty])
+            full_bfs = probes[0]
+            dir2bfs = dict(zip(empty, probes[1:]))
             empty_count = full_bfs.empty_count
             heads = 0
             for i in xrange(4):
                 if self.grid.head_of(i) in full_bfs.objects:
                     heads += 1
 
-            self.left_vars = self.calc_vars(left)
-            self.straight_vars = self.calc_vars(straight)
-            self.right_vars = self.calc_vars(right)
+            self.left_vars = self.calc_vars(left, dir2bfs.get(left))
+            self.straight_vars = self.calc_vars(straight,
+                    dir2bfs.get(straight))
+            self.right_vars = self.calc_vars(right, dir2bfs.get(right))
             self.dir2vars = {-1: self.left_vars, 0: self.straight_vars,
                     1: self.right_vars}
 
@@ -16,12 +16,15 @@ class AIHugger(AIBase):
     depth_limit = 30
     unhug = False
     threshold = 90
+    parity = False
 
     def __init__(self):
         super(AIHugger, self).__init__()
         self.add_param('depth_limit', 'l', help='Depth of the BFS search.')
         self.add_param('unhug', 'u', type=bool, help='To hug or not to hug?')
         self.add_param('threshold', 't', help='Pocket volume threshold.')
+        self.add_param('parity', 'p', type=bool,
+                help='Count only the space that can be filled.')
 
     def go_hug(self):
         """See if there's an obstacle nearby and stay next to it."""
@@ -35,19 +38,27 @@ class AIHugger(AIBase):
         if start_dir_no is None:
             return 'LEFT'  # whatever
 
-        full_bfs = self.grid.bfs_probe(self.my_pos, limit=self.depth_limit)
-
-        options = {}
+        candidates = []
         for i in xrange(start_dir_no, start_dir_no + 4):
             direction = directions[i % 4]
-            offset = self.grid.DIRECTIONS[direction]
-            new_pos = self.my_pos + offset
-            if self.grid[new_pos] != 0: continue
-            pr = self.grid.bfs_probe(new_pos, limit=self.depth_limit)
-            if pr.empty_count >= full_bfs.empty_count * self.threshold / 100.0:
+            new_pos = self.my_pos + self.grid.DIRECTIONS[direction]
+            if self.grid[new_pos] == 0:
+                candidates.append((direction, new_pos))
+
+        probes = self.grid.bfs_probe_many(
+                [self.my_pos] + [pos for _, pos in candidates],
+                limit=self.depth_limit, lean=True)
+        if self.parity:
+            volumes = [pr.fillable for pr in probes]
+        else:
+            volumes = [pr.empty_count for pr in probes]
+
+        options = {}
+        for (direction, _), volume in zip(candidates, volumes[1:]):
+            if volume >= volumes[0] * self.threshold / 100.0:
                 return direction
             else:
-                options[pr.empty_count] = direction
+                options[volume] = direction
 
         if options:
             return options[max(options)]
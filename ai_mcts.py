@@ -0,0 +1,72 @@
+"""
+Tron Battle AI using Monte Carlo tree search.
+"""
+
+import sys
+import time
+
+from client import run_ai  # @include(client.py)
+from ai_wanderer import AIWanderer  # @include(ai_wanderer.py)
+from mcts import EXPLORATION, MCTS  # @include(mcts.py)
+
+
+class AIMCTS(AIWanderer):
+    """Tron Battle AI: MCTS.
+
+    if can see others:
+        use Monte Carlo tree search
+    else:
+        fill (users wanderer)
+    """
+
+    # Wanderer config overrides
+    depth_limit = 30
+    obstacle_fear = -3
+    space_love = 30
+
+    # MCTS config
+    time_limit = 80
+    playouts = 0
+    playout = 'random'
+    exploration = EXPLORATION
+
+    def __init__(self):
+        super(AIMCTS, self).__init__()
+        self.add_param('time_limit', 't',
+                help='Time for the search in ms (0 for no limit, needs -n).')
+        self.add_param('playouts', 'n',
+                help='Max number of playouts (0 for no limit, needs -t).')
+        self.add_param('playout', 'r', type=str,
+                help='Policy of the playouts: random or hug.')
+        self.add_param('exploration', 'c', type=float,
+                help='Exploration constant of UCT.')
+
+    def configure(self):
+        """Configure and check that the search has a limit."""
+        super(AIMCTS, self).configure()
+        if not self.time_limit and not self.playouts:
+            sys.exit('Time limit (-t) or playouts (-n) must be given')
+
+    def go(self):
+        """Act depending if we see others."""
+        if self.can_see_others():
+            mcts = MCTS(self.grid, self.players[self.my_number],
+                    playout=self.playout, exploration=self.exploration)
+            start = time.time()
+            reward, move = mcts.find_best_move(
+                    playouts=self.playouts or None,
+                    time_limit=self.time_limit)
+            self.report(mcts.playouts, time.time() - start)
+            if reward > 0:
+                return move
+        return self.go_wander()
+
+    def report(self, playouts, secs):
+        """Write the number and the rate of the playouts to stderr."""
+        rate = playouts / secs if secs > 0 else 0
+        sys.stderr.write('{} playouts in {:.0f} ms, {:.0f}/s\n'.format(
+                playouts, secs * 1000, rate))
+
+
+if __name__ == '__main__':
+    run_ai(AIMCTS)
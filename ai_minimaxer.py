@@ -4,7 +4,7 @@ Tron Battle AI using minimax algorithm.
 
 from client import run_ai  # @include(client.py)
 from ai_wanderer import AIWanderer  # @include(ai_wanderer.py)
-from minimax import MiniMax  # @include(minimax.py)
+from minimax import MiniMax, TranspositionTable  # @include(minimax.py)
 
 
 class AIMiniMaxer(AIWanderer):
@@ -24,6 +24,12 @@ class AIMiniMaxer(AIWanderer):
     # MiniMax config
     max_layers = 8
     max_layer_size = 10
+    evaluation = 'volume'
+    alpha_beta = False
+    max_nodes = 100
+    time_limit = 0
+    table_size = 0
+    best_reply = False
 
     def __init__(self):
         super(AIMiniMaxer, self).__init__()
@@ -31,25 +37,60 @@ class AIMiniMaxer(AIWanderer):
                 help='Number of minimax layers.')
         self.add_param('max_layer_size', 'y',
                 help='Max number of states in the layer.')
+        self.add_param('evaluation', 'e', type=str,
+                help='Evaluation of the states: volume, fillable or '
+                'voronoi.')
+        self.add_param('alpha_beta', 'a', type=bool,
+                help='Use the alpha-beta search: deepen it until it '
+                'has\nsearched -n positions (up to -m layers).')
+        self.add_param('max_nodes', 'n',
+                help='Positions searched by -a (0 to search as deep as '
+                'the\nlayered search with -y).')
+        self.add_param('time_limit', 't',
+                help='Time for the search in ms: deepen the alpha-beta '
+                'search\nuntil it runs out (up to -m layers, -y is not '
+                'used).')
+        self.add_param('table_size', 'z',
+                help='Size of the transposition table kept between the '
+                'turns\n(0 for no table).')
+        self.add_param('best_reply', 'b', type=bool,
+                help='Best-reply search: only one opponent moves on the '
+                'plies\nof the opponents.')
 
-    def can_see_others(self):
-        """Return True if we can reach other players."""
-        self.full_bfs = self.grid.bfs_probe(self.my_pos)
-        for i in xrange(4):
-            if self.grid.head_of(i) in self.full_bfs.objects:
-                return True
-        return False
+    @property
+    def grid_options(self):
+        """Keep the hash of the grid for the transposition table."""
+        return {'hashed': self.table_size > 0}
+
+    # Value found by the last search, the guess for the next one.
+    last_weight = None
+    # Transposition table shared by the searches.
+    table = None
 
     def go(self):
         """Act depending if we see others."""
         if self.can_see_others():
-            mm = MiniMax(self.grid, self.players[self.my_number],
-                    full_bfs=self.full_bfs)
+            if self.table is None and self.table_size > 0:
+                self.table = TranspositionTable(self.table_size)
+            grid = self.grid
+            if self.alpha_beta or self.time_limit:
+                # The depth-first searches make the moves on the grid, the
+                # copy doesn't have the Components tracker to update on
+                # every move.
+                grid = grid.copy()
+            mm = MiniMax(grid, self.players[self.my_number],
+                    evaluation=self.evaluation, alpha_beta=self.alpha_beta,
+                    table=self.table, best_reply=self.best_reply)
             weight, move = mm.find_best_move(max_layers=self.max_layers,
-                    max_layer_size=self.max_layer_size)
+                    max_layer_size=self.max_layer_size,
+                    guess=self.last_weight, time_limit=self.time_limit,
+                    max_nodes=self.max_nodes if self.alpha_beta else None)
             mm.unlink_states()
+            self.last_weight = weight
             if weight > 0:
                 return move
+        else:
+            self.last_weight = None
         return self.go_wander()
 
 
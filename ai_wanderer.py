@@ -4,6 +4,7 @@ Tron Battle AI. Doesn't go into obstacles if it can.
 
 from client import run_ai  # @include(client.py)
 from ai_base import AIBase  # @include(ai_base.py)
+from grid import Components  # @include(grid.py)
 
 
 class AIWanderer(AIBase):
@@ -18,6 +19,7 @@ class AIWanderer(AIBase):
     distance_love = 100
     obstacle_fear = 100
     space_love = 100
+    parity = False
 
     def __init__(self):
         super(AIWanderer, self).__init__()
@@ -29,17 +31,22 @@ class AIWanderer(AIBase):
                 help='Relative weight of distance to closest obstacle.')
         self.add_param('space_love', 's',
                 help='Relative weight of amount of space.')
+        self.add_param('parity', 'p', type=bool,
+                help='Count only the space that can be filled.')
 
     def go_wander(self):
         """Find the direction with least interference."""
         options = {}
-        for dir, offset in self.grid.DIRECTIONS.items():
-            new_pos = self.my_pos + offset
-            if self.grid[new_pos] != 0: continue
-            pr = self.grid.bfs_probe(new_pos, limit=self.depth_limit)
+        dirs = [dir for dir, offset in self.grid.DIRECTIONS.items()
+                if self.grid[self.my_pos + offset] == 0]
+        probes = self.grid.bfs_probe_many(
+                [self.my_pos + self.grid.DIRECTIONS[dir] for dir in dirs],
+                limit=self.depth_limit)
+        for dir, pr in zip(dirs, probes):
             weight = pr.max_distance * self.distance_love
             if weight > 0:
-                weight += self.space_love * pr.empty_count
+                space = pr.fillable if self.parity else pr.empty_count
+                weight += self.space_love * space
                 if pr.closest_obstacle_d is not None:
                     weight += self.obstacle_fear * pr.closest_obstacle_d
                 options[weight] = dir
@@ -49,6 +56,21 @@ class AIWanderer(AIBase):
         else:
             return '!'
 
+    # Labeling of the pockets, kept up to date by the grid.
+    components = None
+
+    def can_see_others(self):
+        """Return True if we can reach other players."""
+        if self.components not in self.grid.trackers:
+            self.components = self.grid.add_tracker(Components())
+        for i, player in self.players.items():
+            if i == self.my_number or not player.is_alive:
+                continue
+            head = self.grid.coords2index(*player.head)
+            if self.components.connected(self.my_pos, head):
+                return True
+        return False
+
     go = go_wander
 
 
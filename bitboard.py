@@ -0,0 +1,181 @@
+"""
+Bitboard -- the field of the Tron Battle packed into big integers.
+"""
+
+from collections import defaultdict
+
+from grid import GridTracker, ProbeResult, TronGrid  # @include(grid.py)
+from grid import HEIGHT, WIDTH  # @include(grid.py)
+
+
+#: Offset of the bit numbers from the grid indices on the default board. The
+#: offset is the length of the row (``TronGrid.stride``): the extra row above
+#: the field holds the top wall (the array grid gets it from the padding at
+#: the end via negative indices).
+OFFSET = 64
+
+
+def popcount(mask):
+    """Return the number of set bits in the mask."""
+    return bin(mask).count('1')
+
+
+def mask2indices(mask, offset=OFFSET):
+    """Return the grid indices of the bits set in the mask."""
+    ret = []
+    while mask:
+        low = mask & -mask
+        ret.append(low.bit_length() - 1 - offset)
+        mask ^= low
+    return ret
+
+
+def lowest_index(mask, offset=OFFSET):
+    """Return the grid index of the lowest set bit in the mask."""
+    return (mask & -mask).bit_length() - 1 - offset
+
+
+def expand(mask, stride=OFFSET):
+    """Return the cells adjacent to the cells of the mask."""
+    return mask << 1 | mask >> 1 | mask << stride | mask >> stride
+
+
+class BitProbeResult(ProbeResult):
+    """Probe result that keeps the layers as masks.
+
+    The layers are converted to the lists of indices only when they are
+    accessed.
+    """
+
+    def __init__(self, steps, empty_count, obj2dist, obj2pos, layer_masks,
+            odd_count=None, offset=OFFSET):
+        super(BitProbeResult, self).__init__(steps, empty_count, obj2dist,
+                obj2pos, odd_count=odd_count)
+        self.layer_masks = layer_masks
+        self.offset = offset
+
+    @property
+    def layers(self):
+        return [mask2indices(mask, self.offset) for mask in self.layer_masks]
+
+    def get_pos_step(self, pos):
+        """Return the step on which ``pos`` was passed.
+
+        Returns None if ``pos`` was not passed.
+        """
+        bit = 1 << (pos + self.offset)
+        for step, mask in enumerate(self.layer_masks):
+            if mask & bit:
+                return step
+        return None
+
+
+class BitBoard(GridTracker):
+    """Bitboard representation of the grid.
+
+    Keeps one mask per cell value: empty cells, walls and bodies and heads
+    of every player. Bit number of the cell is its index plus the length of
+    the row (``offset``), so the neighbours of the cells are found by
+    shifting the mask by 1 and by the length of the row. The BFS expands the
+    whole layer with one operation instead of visiting the cells one by one.
+    """
+
+    def reset(self, grid):
+        self.offset = offset = grid.stride
+        masks = defaultdict(int)
+        for idx, value in enumerate(grid.grid):
+            masks[value] |= 1 << (idx + offset)
+        masks[-1] |= (1 << offset) - 1  # Top wall.
+        self.masks = masks
+
+    def update(self, grid, idx, old, new):
+        bit = 1 << (idx + self.offset)
+        self.masks[old] &= ~bit
+        self.masks[new] |= bit
+
+    def replaced(self, grid, cells, src, dst):
+        masks = self.masks
+        masks[dst] |= masks[src]
+        masks[src] = 0
+
+    @property
+    def empty(self):
+        """Mask of the empty cells."""
+        return self.masks[0]
+
+    def empty_count(self):
+        """Return the number of empty cells."""
+        return popcount(self.masks[0])
+
+    def reachable(self, origins, limit=None):
+        """Return the mask of empty cells reachable from ``origins``.
+
+        If ``limit`` is specified, don't go beyond that many steps.
+        """
+        free = self.masks[0]
+        offset = self.offset
+        visited = front = sum(1 << (pos + offset) for pos in set(origins))
+        steps = 0
+        while front:
+            steps += 1
+            if limit is not None and steps > limit:
+                break
+            front = expand(front, offset) & free & ~visited
+            visited |= front
+        return visited & free
+
+    def bfs_probe(self, start_pos, limit=None, lean=False):
+        """Bitboard version of ``TronGrid.bfs_probe``."""
+        offset = self.offset
+        start = 1 << (start_pos + offset)
+        free = self.masks[0] | start
+        if lean:
+            pending = []
+        else:
+            pending = [(value, mask) for value, mask in self.masks.items()
+                    if value != 0 and mask & ~start]
+        visited = front = start
+        odd = 0
+        steps = 0
+        obj2dist = {}
+        obj2pos = {}
+        layers = []
+
+        while front:
+            layers.append(front)
+            steps += 1
+            if limit is not None and steps > limit:
+                break
+
+            around = expand(front, offset)
+            touched = pending and around & ~free
+            if touched:
+                for value, mask in pending:
+                    hit = touched & mask
+                    if hit and value not in obj2dist:
+                        obj2dist[value] = steps
+                        obj2pos[value] = lowest_index(hit, offset)
+
+            front = around & free & ~visited
+            visited |= front
+            if steps & 1:
+                odd |= front
+
+        if lean:
+            return ProbeResult(steps - 1, popcount(visited) - 1, obj2dist,
+                    obj2pos, odd_count=popcount(odd))
+        return BitProbeResult(steps - 1, popcount(visited) - 1, obj2dist,
+                obj2pos, layers, popcount(odd), offset)
+
+
+class BitTronGrid(TronGrid):
+    """Tron grid that does the BFS probes on the bitboard."""
+
+    def __init__(self, indexed=False, hashed=False, run_lengths=False,
+            width=WIDTH, height=HEIGHT):
+        super(BitTronGrid, self).__init__(indexed, hashed, run_lengths,
+                width, height)
+        self.bits = self.add_tracker(BitBoard())
+
+    def bfs_probe(self, start_pos, limit=None, lean=False):
+        return self.bits.bfs_probe(start_pos, limit, lean)
@@ -2,25 +2,37 @@
 Tron Battle client library. Basic code for talking to the server.
 """
 
+import os
 import sys
 
-from grid import TronGrid  # @include(grid.py)
+from grid import HEIGHT, WIDTH, TronGrid  # @include(grid.py)
 from player import PlayerInfo  # @include(player.py)
 
 
+def board_size():
+    """Return the size of the board passed by the server in ``TRON_BOARD``
+    (the default board if it's not there)."""
+    board = os.environ.get('TRON_BOARD')
+    if not board:
+        return WIDTH, HEIGHT
+    width, height = map(int, board.split('x'))
+    return width, height
+
+
 def run_ai(ai_class):
     """Run AI class as a player."""
     ai = ai_class()
     ai.configure()
-    tc = TronClient(ai)
+    tc = TronClient(ai, *board_size())
     tc.run()
 
 
 class TronClient(object):
 
-    def __init__(self, handler):
+    def __init__(self, handler, width=WIDTH, height=HEIGHT):
         self.handler = handler
-        self.grid = TronGrid()
+        self.grid = TronGrid(width=width, height=height,
+                **getattr(handler, 'grid_options', {}))
         self.players = {}
         self.my_number = 0
         self.players_count = 0
@@ -0,0 +1,229 @@
+"""
+Corridors -- the empty space of the grid with the corridors compressed.
+
+The graph is for analysing the positions, the bots don't use it.
+"""
+
+import heapq
+from array import array
+
+from grid import GridTracker  # @include(grid.py)
+
+
+class Degrees(GridTracker):
+    """Number of the empty neighbours of every cell."""
+
+    def reset(self, grid):
+        cells = grid.grid
+        directions = grid.DIRECTIONS.values()
+        self.degrees = degrees = array('b', [0]) * len(cells)
+        for idx, value in enumerate(cells):
+            if value == 0:
+                for d in directions:
+                    degrees[idx + d] += 1
+
+    def update(self, grid, idx, old, new):
+        if (old == 0) != (new == 0):
+            delta = 1 if new == 0 else -1
+            degrees = self.degrees
+            for d in grid.DIRECTIONS.values():
+                degrees[idx + d] += delta
+
+    def replaced(self, grid, cells, src, dst):
+        for idx in cells:
+            self.update(grid, idx, src, dst)
+
+
+class CorridorGraph(object):
+    """Empty space with the corridors compressed into edges.
+
+    Nodes are the empty cells that don't have exactly two empty neighbours
+    (junctions and dead ends) plus one cell of every closed loop. The
+    corridors between them become edges that are kept as
+    ``(node1, node2, cells)`` where ``cells`` are the corridor cells from
+    ``node1`` to ``node2``. ``nodes`` maps the nodes to the numbers of their
+    edges and ``cell2edge`` maps the corridor cells to their edges.
+    ``stride`` is the row length of the grid (see ``TronGrid``).
+    """
+
+    def __init__(self, nodes, edges, cell2edge, stride=64):
+        self.nodes = nodes
+        self.edges = edges
+        self.cell2edge = cell2edge
+        self.offsets = -stride, -1, 1, stride
+
+    def entries(self, pos):
+        """Return the nodes reachable from ``pos`` with their distances.
+
+        Only the empty neighbours of ``pos`` and the ends of their corridors
+        are considered, so ``pos`` itself may be occupied.
+        """
+        ret = {}
+        for npos in (pos + d for d in self.offsets):
+            if npos in self.nodes:
+                candidates = [(npos, 1)]
+            elif npos in self.cell2edge:
+                node1, node2, cells = self.edges[self.cell2edge[npos]]
+                i = cells.index(npos)
+                candidates = [(node1, i + 2), (node2, len(cells) - i + 1)]
+            else:
+                continue
+            for node, dist in candidates:
+                if dist < ret.get(node, dist + 1):
+                    ret[node] = dist
+        return ret
+
+    def distances(self, pos):
+        """Return the distances from ``pos`` to the reachable nodes."""
+        dist = {pos: 0} if pos in self.nodes else self.entries(pos)
+        heap = [(d, node) for node, d in dist.items()]
+        heapq.heapify(heap)
+        while heap:
+            d, node = heapq.heappop(heap)
+            if d > dist[node]:
+                continue
+            for edge_no in self.nodes[node]:
+                node1, node2, cells = self.edges[edge_no]
+                other = node2 if node1 == node else node1
+                other_d = d + len(cells) + 1
+                if other_d < dist.get(other, other_d + 1):
+                    dist[other] = other_d
+                    heapq.heappush(heap, (other_d, other))
+        return dist
+
+    def empty_count(self, pos):
+        """Return the number of empty cells reachable from ``pos``.
+
+        Same as ``bfs_probe(pos).empty_count`` but it only walks the nodes.
+        """
+        seen = set(self.entries(pos))
+        front = list(seen)
+        edges = set()
+        while front:
+            node = front.pop()
+            for edge_no in self.nodes[node]:
+                edges.add(edge_no)
+                node1, node2, cells = self.edges[edge_no]
+                for other in (node1, node2):
+                    if other not in seen:
+                        seen.add(other)
+                        front.append(other)
+        count = len(seen) + sum(len(self.edges[i][2]) for i in edges)
+        return count - 1 if pos in seen or pos in self.cell2edge else count
+
+    def fill_estimate(self, pos, budget=500):
+        """Estimate how many cells can be filled going from ``pos``.
+
+        Looks for the longest path from ``pos`` through the nodes: a path
+        takes the whole corridors and can end by going into a corridor that
+        leads to a node it has passed. The search is stopped after
+        ``budget`` nodes, so the result is the best path found by then.
+        """
+        nodes = self.nodes
+        edges = self.edges
+        state = {'budget': budget, 'best': 0}
+        visited = set()
+        used = set()
+
+        def search(node, length):
+            state['budget'] -= 1
+            visited.add(node)
+            best = length
+            for edge_no in nodes[node]:
+                if edge_no in used or state['budget'] <= 0:
+                    continue
+                node1, node2, cells = edges[edge_no]
+                other = node2 if node1 == node else node1
+                used.add(edge_no)
+                if other in visited:
+                    best = max(best, length + len(cells))
+                else:
+                    best = max(best, search(other, length + len(cells) + 1))
+                used.discard(edge_no)
+            visited.discard(node)
+            return best
+
+        best = 0
+        if pos in self.nodes:
+            starts = [(pos, 0, None)]
+        elif pos in self.cell2edge:
+            edge_no = self.cell2edge[pos]
+            node1, node2, cells = edges[edge_no]
+            i = cells.index(pos)
+            starts = [(node1, i + 1, edge_no),
+                    (node2, len(cells) - i, edge_no)]
+        else:
+            starts = []
+            for npos in (pos + d for d in self.offsets):
+                if npos in nodes:
+                    starts.append((npos, 1, None))
+                elif npos in self.cell2edge:
+                    edge_no = self.cell2edge[npos]
+                    node1, node2, cells = edges[edge_no]
+                    i = cells.index(npos)
+                    starts.append((node1, i + 2, edge_no))
+                    starts.append((node2, len(cells) - i + 1, edge_no))
+        for node, length, edge_no in starts:
+            used.add(edge_no)
+            best = max(best, search(node, length))
+            used.discard(edge_no)
+        return best
+
+
+def corridor_graph(grid):
+    """Build the ``CorridorGraph`` of the empty space.
+
+    Uses the ``Degrees`` tracker of the grid if it has one.
+    """
+    for degrees in grid.trackers:
+        if isinstance(degrees, Degrees):
+            break
+    else:
+        degrees = Degrees()
+        degrees.reset(grid)
+    degrees = degrees.degrees
+    directions = grid.DIRECTIONS.values()
+    values = grid.grid
+    empty = [idx for idx, value in enumerate(values) if value == 0]
+    nodes = {idx: [] for idx in empty if degrees[idx] != 2}
+    edges = []
+    cell2edge = {}
+
+    def walk(node, pos):
+        prev = node
+        cells = []
+        while pos not in nodes:
+            cells.append(pos)
+            for d in directions:
+                if pos + d != prev and values[pos + d] == 0:
+                    break
+            prev, pos = pos, pos + d
+        edge_no = len(edges)
+        edges.append((node, pos, cells))
+        nodes[node].append(edge_no)
+        if pos != node:
+            nodes[pos].append(edge_no)
+        for cell in cells:
+            cell2edge[cell] = edge_no
+
+    for node in nodes.keys():
+        for d in directions:
+            pos = node + d
+            if pos in nodes:
+                if node < pos:
+                    edges.append((node, pos, []))
+                    nodes[node].append(len(edges) - 1)
+                    nodes[pos].append(len(edges) - 1)
+            elif values[pos] == 0 and pos not in cell2edge:
+                walk(node, pos)
+
+    # Closed loops of corridor cells get one of their cells as a node.
+    for idx in empty:
+        if idx not in nodes and idx not in cell2edge:
+            nodes[idx] = []
+            for d in directions:
+                if values[idx + d] == 0:
+                    walk(idx, idx + d)
+                    break
+
+    return CorridorGraph(nodes, edges, cell2edge, grid.stride)
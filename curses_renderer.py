@@ -59,7 +59,8 @@ class CursesRenderer(object):
 
     def render_field(self, server):
         """Render the field."""
-        field = self.screen.subwin(22, 32, 1, 1)
+        grid = server.grid
+        field = self.screen.subwin(grid.height + 2, grid.width + 2, 1, 1)
 
         for player in server.alive_players:
             for i, point in enumerate(player.points):
@@ -86,7 +87,7 @@ class CursesRenderer(object):
 
     def render_player_info(self, server):
         """Render the information about the players."""
-        stats_box = self.screen.subwin(7, 70, 23, 1)
+        stats_box = self.screen.subwin(7, 70, server.grid.height + 3, 1)
 
         stats_box.addstr(1, 2, 'Turn {}:'.format(server.turn_count))
         for i, player in sorted(server.players.items()):
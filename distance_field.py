@@ -0,0 +1,140 @@
+"""
+Distance field -- distances from one cell kept up to date with the grid.
+"""
+
+from collections import defaultdict
+
+from grid import DISTANCE_MARK, GridTracker  # @include(grid.py)
+
+
+class DistanceField(GridTracker):
+    """Distances from the source cell, repaired as the grid changes.
+
+    ``marks`` is a copy of the grid where the cells reachable from the
+    source hold ``DISTANCE_MARK`` plus the distance (like
+    ``ProbeResult.distances``). When a reached cell is filled, only the cells
+    whose shortest paths went through it are reset and linked back to the
+    intact cells around them. When a cell is freed, the distances are
+    lowered starting from it.
+    """
+
+    copied = False
+
+    def __init__(self, source):
+        self.source = source
+
+    def reset(self, grid):
+        self.directions = grid.DIRECTIONS.values()
+        self.marks = grid.bfs_probe(self.source).distances
+
+    def update(self, grid, idx, old, new):
+        if idx == self.source:
+            return
+        marks = self.marks
+        mark = marks[idx]
+        if new == 0:
+            if old != 0:
+                marks[idx] = 0
+                self.lower(self.link([idx]))
+        else:
+            marks[idx] = new
+            if mark >= DISTANCE_MARK:
+                self.invalidate([(idx, mark)])
+
+    def replaced(self, grid, cells, src, dst):
+        marks = self.marks
+        cells = [pos for pos in cells if pos != self.source]
+        seeds = [(pos, marks[pos]) for pos in cells
+                if marks[pos] >= DISTANCE_MARK]
+        for pos in cells:
+            marks[pos] = dst
+        if dst == 0:
+            self.lower(self.link(cells))
+        elif seeds:
+            self.invalidate(seeds)
+
+    def distance(self, pos):
+        """Return the distance from the source to ``pos`` (None if it can't
+        be reached)."""
+        mark = self.marks[pos]
+        return mark - DISTANCE_MARK if mark >= DISTANCE_MARK else None
+
+    def link(self, cells):
+        """Mark the cells as one step further than their closest reached
+        neighbours. Return the cells that got reached."""
+        marks = self.marks
+        directions = self.directions
+        linked = []
+        for pos in cells:
+            best = None
+            for d in directions:
+                mark = marks[pos + d]
+                if mark >= DISTANCE_MARK and (best is None or mark < best):
+                    best = mark
+            if best is not None:
+                marks[pos] = best + 1
+                linked.append(pos)
+        return linked
+
+    def lower(self, seeds):
+        """Propagate the marks of the seeds to the cells around."""
+        marks = self.marks
+        directions = self.directions
+        buckets = defaultdict(list)
+        for pos in seeds:
+            buckets[marks[pos]].append(pos)
+        mark = min(buckets) if buckets else 0
+        while buckets:
+            for pos in buckets.pop(mark, ()):
+                if marks[pos] != mark:
+                    continue  # Lowered further since.
+                for d in directions:
+                    value = marks[pos + d]
+                    if value == 0 or value > mark + 1:
+                        marks[pos + d] = mark + 1
+                        buckets[mark + 1].append(pos + d)
+            mark += 1
+
+    def invalidate(self, seeds):
+        """Repair the distances after the seeds lost their marks.
+
+        ``seeds`` is a list of ``(pos, old_mark)``. The cells that are left
+        without a neighbour one step closer to the source are found level by
+        level, reset and linked back to the intact cells.
+        """
+        marks = self.marks
+        directions = self.directions
+        invalid = set()
+        buckets = defaultdict(list)
+        for pos, mark in seeds:
+            for d in directions:
+                if marks[pos + d] == mark + 1:
+                    buckets[mark + 1].append(pos + d)
+        mark = min(buckets) if buckets else 0
+        while buckets:
+            for pos in buckets.pop(mark, ()):
+                if pos in invalid:
+                    continue
+                for d in directions:
+                    if marks[pos + d] == mark - 1 and pos + d not in invalid:
+                        break
+                else:
+                    invalid.add(pos)
+                    for d in directions:
+                        if marks[pos + d] == mark + 1:
+                            buckets[mark + 1].append(pos + d)
+            mark += 1
+        for pos in invalid:
+            marks[pos] = 0
+        self.lower(self.link(invalid))
+
+    def move_source(self, grid, new_source):
+        """Re-root the field on ``new_source``.
+
+        When the source moves by one step the distance of every reached cell
+        changes by one, so the field is rebuilt with a BFS: it's about three
+        times faster than lowering the cells in front of the new source and
+        repairing the ones behind.
+        """
+        self.source = new_source
+        self.reset(grid)
@@ -2,62 +2,542 @@
 Grid -- the field of the Tron Battle.
 """
 
+import random
+import sys
 from array import array
 from collections import defaultdict, deque
 from copy import deepcopy, copy
 
+try:
+    import numpy
+except ImportError:  # NumPy is optional, used by ``bfs_probe_many``.
+    numpy = None
+
+
+#: Size of the default board.
+WIDTH = 30
+HEIGHT = 20
+
+
+def row_shift(width):
+    """Return the shift of the row numbers in the grid indices.
+
+    The rows are at least 64 cells long (so that the default board keeps
+    its layout) and have at least one wall cell after the playing area.
+    """
+    return max(6, width.bit_length())
+
+
+def empty_grid(width, height):
+    """Return the cells of the empty grid (see ``TronGrid``)."""
+    stride = 1 << row_shift(width)
+    return array('h', ([0] * width + [-1] * (stride - width)) * height +
+            [-1] * (stride * 2))
+
+
+#: Cells of the empty default grid.
+EMPTY_GRID = empty_grid(WIDTH, HEIGHT)
+
+#: Largest cell value that ``TronGrid.pack`` can store (15 is the wall).
+MAX_PACKED_CELL = 14
+#: Index of the low byte in the items of ``array('h')``.
+LOW_BYTE = 0 if sys.byteorder == 'little' else 1
+#: Translation of the low bytes of the cells that can be packed to their
+#: high bytes (the rest go to 1, the cells with that high byte can't be
+#: packed either).
+LOW2HIGH = ''.join('\0' if byte <= MAX_PACKED_CELL else
+        '\xff' if byte == 255 else '\1' for byte in xrange(256))
+#: Translation tables between the cells and the hex digits of their nibbles.
+#: ``TronGrid.pack`` goes through a hex string to do the packing in C.
+CELL2HEX = ''.join('{:x}'.format(byte & 15) for byte in xrange(256))
+HEX2CELL = {'{:x}'.format(nibble): array('h', [nibble if nibble < 15 else -1])
+        .tostring() for nibble in xrange(16)}
+#: Wall cell as ``array('h')`` bytes.
+WALL_CELL = array('h', [-1]).tostring()
+
+#: Cells passed by ``TronGrid.bfs_probe`` are marked with this value plus the
+#: step on which they were passed.
+DISTANCE_MARK = 16384
+
 
 class ProbeResult(object):
-    """Result of a probe."""
+    """Result of a probe.
+
+    The values derived from the objects are computed when they are
+    accessed. The passed positions are kept either as the list of layers or
+    as the map of distances (a copy of the grid where the passed cells hold
+    ``DISTANCE_MARK`` plus the distance), or not at all.
 
-    #: Value of the closest obstacle
-    closest_obstacle = None
-    #: Distance to the closest obstacle
-    closest_obstacle_d = None
+    ``odd_count`` is the number of the empty cells passed on odd steps, they
+    are the cells of the other colour than the start on the checkerboard.
+    """
 
-    def __init__(self, steps, empty_count, obj2dist, obj2pos, layers):
+    def __init__(self, steps, empty_count, obj2dist, obj2pos, layers=None,
+            distances=None, odd_count=None):
         self.max_distance = steps
         self.empty_count = empty_count
+        self.odd_count = odd_count
         self.obj2dist = obj2dist
-        self.objects = set(obj2dist.keys())
         self.obj2pos = obj2pos
-        self.layers = layers
+        self._layers = layers
+        self.distances = distances
 
-        self.dist2obj = defaultdict(list)
-        for obj, dist in obj2dist.items():
-            self.dist2obj[dist].append(obj)
+    @property
+    def objects(self):
+        """Set of objects encountered."""
+        return set(self.obj2dist)
+
+    @property
+    def dist2obj(self):
+        """Lists of objects by distance."""
+        dist2obj = defaultdict(list)
+        for obj, dist in self.obj2dist.items():
+            dist2obj[dist].append(obj)
+        return dist2obj
+
+    @property
+    def closest_obstacle(self):
+        """Value of the closest obstacle."""
+        if self.obj2dist:
+            return min(self.obj2dist.items(), key=lambda od: od[1])[0]
+        return None
+
+    @property
+    def closest_obstacle_d(self):
+        """Distance to the closest obstacle."""
+        if self.obj2dist:
+            return min(self.obj2dist.values())
+        return None
+
+    @property
+    def fillable(self):
+        """Parity-corrected bound of the number of moves from the start.
+
+        Every move changes the colour of the cell on the checkerboard, so a
+        path can't have more cells of one colour than of the other, plus one
+        extra cell of the other colour than the start.
+        """
+        if self.odd_count is None:
+            return None
+        odd = self.odd_count
+        even = self.empty_count - odd
+        return min(odd, even) * 2 + (odd > even)
 
-        if self.dist2obj:
-            self.closest_obstacle_d = min(self.dist2obj.keys())
-            self.closest_obstacle = self.dist2obj[self.closest_obstacle_d][0]
+    @property
+    def layers(self):
+        """Lists of positions passed on each step."""
+        if self._layers is None and self.distances is not None:
+            self._layers = [[] for i in xrange(self.max_distance + 1)]
+            for pos, value in enumerate(self.distances):
+                if DISTANCE_MARK <= value <= DISTANCE_MARK + self.max_distance:
+                    self._layers[value - DISTANCE_MARK].append(pos)
+        return self._layers
 
     def get_pos_step(self, pos):
         """Return the step on which ``pos`` was passed.
 
         Returns None if ``pos`` was not passed.
         """
-        for step, layer in enumerate(self.layers):
+        if self.distances is not None:
+            step = self.distances[pos] - DISTANCE_MARK
+            return step if step >= 0 else None
+        for step, layer in enumerate(self.layers or ()):
             if pos in layer:
                 return step
         return None
 
 
+class RayProbeResult(ProbeResult):
+    """Result of a ray probe.
+
+    The layers are kept as the rows of the cone and converted to the lists
+    of positions only when they are accessed.
+    """
+
+    def __init__(self, steps, empty_count, obj2dist, obj2pos, rows, side,
+            flip):
+        super(RayProbeResult, self).__init__(steps, empty_count, obj2dist,
+                obj2pos)
+        self.rows = rows
+        self.side = side
+        self.flip = flip
+
+    @property
+    def layers(self):
+        if self._layers is None:
+            self._layers = []
+            for base, lo, hi, lanes in self.rows:
+                layer = [base + lane * self.side
+                        for lane in (lanes or xrange(lo, hi + 1))]
+                if self.flip:
+                    layer.reverse()
+                self._layers.append(layer)
+        return self._layers
+
+
+class VoronoiResult(object):
+    """Result of splitting the space between the players."""
+
+    def __init__(self, owner, heads, directions):
+        self.directions = directions
+        #: Owner of every reachable empty cell (None for ties).
+        self.owner = owner
+        #: Number of cells owned by each player.
+        self.counts = dict.fromkeys(heads, 0)
+        for player in owner.itervalues():
+            if player is not None:
+                self.counts[player] += 1
+        #: Number of cells that are equally close to several players.
+        self.ties = len(owner) - sum(self.counts.values())
+
+    @property
+    def frontier(self):
+        """Cells of each player that touch cells of others or ties."""
+        owner = self.owner
+        frontier = {player: [] for player in self.counts}
+        for pos, player in owner.iteritems():
+            if player is None:
+                continue
+            for d in self.directions:
+                if owner.get(pos + d, player) != player:
+                    frontier[player].append(pos)
+                    break
+        return frontier
+
+
+class Chamber(object):
+    """Part of the empty space that is entered through one cell.
+
+    Chambers are the biconnected components of the empty space. The cells
+    of a chamber can be visited in (roughly) any order, but the subchambers
+    are dead ends: after entering one of them there's no way back.
+    """
+
+    def __init__(self, entrance, cells, children):
+        #: Cut cell through which the chamber is entered (not included).
+        self.entrance = entrance
+        #: Cells of the chamber.
+        self.cells = cells
+        self.size = len(cells)
+        #: Chambers that are entered through the cells of this one.
+        self.children = children
+        #: Number of cells in this chamber and all the chambers below.
+        self.total = self.size + sum(child.total for child in children)
+        #: Estimate of how many cells can be filled after entering: this
+        #: chamber and the best of the chambers below.
+        self.fillable = self.size + max([child.fillable
+                for child in children] or [0])
+
+    def __repr__(self):
+        return '<Chamber {}:{}+{}>'.format(self.entrance, self.size,
+                len(self.children))
+
+
+class GridTracker(object):
+    """Structure derived from the grid that is kept up to date with it.
+
+    Trackers are attached with ``TronGrid.add_tracker`` and get notified
+    about every change of the grid. Subclasses must implement ``reset`` and
+    can override ``update`` and ``replaced`` to handle the changes faster.
+    """
+
+    #: Copies of the grid made by ``TronGrid.copy`` get a copy of the tracker
+    #: too. Trackers that are too expensive to copy and update for every
+    #: state of a search set this to False.
+    copied = True
+
+    def reset(self, grid):
+        """Rebuild the tracked data from scratch."""
+        raise NotImplementedError()
+
+    def update(self, grid, idx, old, new):
+        """Cell ``idx`` was changed from ``old`` to ``new``."""
+        self.reset(grid)
+
+    def replaced(self, grid, cells, src, dst):
+        """All ``cells`` were changed from ``src`` to ``dst``."""
+        self.reset(grid)
+
+
+class CellIndex(GridTracker):
+    """Index of the cells that hold each positive value (player cells)."""
+
+    def reset(self, grid):
+        self.cells = defaultdict(set)
+        for idx, value in enumerate(grid.grid):
+            if value > 0:
+                self.cells[value].add(idx)
+
+    def update(self, grid, idx, old, new):
+        if old > 0:
+            self.cells[old].discard(idx)
+        if new > 0:
+            self.cells[new].add(idx)
+
+    def replaced(self, grid, cells, src, dst):
+        if src > 0:
+            self.cells.pop(src, None)
+        if dst > 0:
+            self.cells[dst].update(cells)
+
+
+class ZobristHash(GridTracker):
+    """Zobrist hash of the grid.
+
+    The hash is the XOR of the random keys of (position, value) for all
+    non-empty cells, so changing a cell only takes two XORs. The keys are
+    generated from fixed seeds, so the hashes are the same in every
+    process.
+    """
+
+    #: Keys for every value: lists of 64-bit numbers, one per position.
+    keys = {}
+    #: Keys for the player to move.
+    side_keys = [random.Random(i).getrandbits(64) for i in xrange(4)]
+
+    @classmethod
+    def keys_for(cls, value, size):
+        """Return the list of keys of ``value`` for ``size`` positions."""
+        keys = cls.keys.get(value)
+        if keys is None or len(keys) < size:
+            if value == 0:
+                keys = [0] * size
+            else:
+                rnd = random.Random(value + 1024)
+                keys = [rnd.getrandbits(64) for i in xrange(size)]
+            cls.keys[value] = keys
+        return keys
+
+    def reset(self, grid):
+        self.size = len(grid.grid)
+        self.value = 0
+        for value in set(grid.grid):
+            keys = self.keys_for(value, self.size)
+            for idx, cell in enumerate(grid.grid):
+                if cell == value:
+                    self.value ^= keys[idx]
+
+    def update(self, grid, idx, old, new):
+        self.value ^= (self.keys_for(old, self.size)[idx] ^
+                self.keys_for(new, self.size)[idx])
+
+    def replaced(self, grid, cells, src, dst):
+        src_keys = self.keys_for(src, self.size)
+        dst_keys = self.keys_for(dst, self.size)
+        for idx in cells:
+            self.value ^= src_keys[idx] ^ dst_keys[idx]
+
+    def with_side(self, player_number):
+        """Return the hash that also covers the player to move."""
+        return self.value ^ self.side_keys[player_number]
+
+
+class Components(GridTracker):
+    """Connected components of the empty space.
+
+    Filling a cell can only split its component. To find out if it did, the
+    empty neighbours of the cell are searched from, the smallest search
+    going first, until they meet or some of them run out of cells, so the
+    cost is proportional to the smaller part. A single freed cell merges
+    the components around it, freeing many cells (with ``replace`` when a
+    player dies) recomputes everything.
+    """
+
+    copied = False
+
+    def reset(self, grid):
+        self.directions = grid.DIRECTIONS.values()
+        self.labels = array('i', [0]) * len(grid.grid)
+        self.sizes = {}
+        self.next_id = 1
+        for pos, value in enumerate(grid.grid):
+            if value == 0 and not self.labels[pos]:
+                self.sizes[self.next_id] = self.flood(grid, pos, self.next_id)
+                self.next_id += 1
+
+    def update(self, grid, idx, old, new):
+        if old == 0 and new != 0:
+            self.fill(grid, idx)
+        elif old != 0 and new == 0:
+            self.free(grid, idx)
+
+    def replaced(self, grid, cells, src, dst):
+        if cells and (src == 0 or dst == 0):
+            self.reset(grid)
+
+    def flood(self, grid, start, comp):
+        """Label the empty cells connected to ``start`` with ``comp``.
+
+        Doesn't go through the cells that already have this label. Returns
+        the number of labeled cells.
+        """
+        labels = self.labels
+        labels[start] = comp
+        wave = [start]
+        for origin in wave:
+            for d in self.directions:
+                pos = origin + d
+                if grid[pos] == 0 and labels[pos] != comp:
+                    labels[pos] = comp
+                    wave.append(pos)
+        return len(wave)
+
+    def free(self, grid, idx):
+        """Add a freed cell to the components around it."""
+        comps = self.around(idx)
+        if comps:
+            comp = max(comps, key=self.sizes.get)
+            for other in comps - {comp}:
+                del self.sizes[other]
+        else:
+            comp = self.next_id
+            self.next_id += 1
+            self.sizes[comp] = 0
+        self.sizes[comp] += self.flood(grid, idx, comp)
+
+    def fill(self, grid, idx):
+        """Remove a filled cell from its component, split it if needed."""
+        labels = self.labels
+        comp = labels[idx]
+        labels[idx] = 0
+        self.sizes[comp] -= 1
+        if not self.sizes[comp]:
+            del self.sizes[comp]
+            return
+
+        starts = [idx + d for d in self.directions if labels[idx + d] == comp]
+        if len(starts) < 2:
+            return
+
+        owner = {pos: i for i, pos in enumerate(starts)}
+        fronts = [[pos] for pos in starts]
+        cells = [[pos] for pos in starts]
+        group = range(len(starts))
+        active = set(group)
+
+        def find(i):
+            while group[i] != i:
+                i = group[i]
+            return i
+
+        while len({find(i) for i in active}) > 1:
+            i = min((len(cells[k]), k) for k in active if fronts[k])[1]
+            front = []
+            for origin in fronts[i]:
+                for d in self.directions:
+                    pos = origin + d
+                    if labels[pos] != comp:
+                        continue
+                    j = owner.get(pos)
+                    if j is None:
+                        owner[pos] = i
+                        front.append(pos)
+                    elif find(j) != find(i):
+                        group[find(j)] = find(i)
+            cells[i].extend(front)
+            fronts[i] = front
+
+            root = find(i)
+            members = [k for k in active if find(k) == root]
+            if not any(fronts[k] for k in members):
+                # The search ran out of cells: split it off.
+                new_comp = self.next_id
+                self.next_id += 1
+                size = 0
+                for k in members:
+                    for pos in cells[k]:
+                        labels[pos] = new_comp
+                    size += len(cells[k])
+                self.sizes[new_comp] = size
+                self.sizes[comp] -= size
+                active.difference_update(members)
+
+    def component_of(self, pos):
+        """Return the id of the component of an empty cell (None if full)."""
+        return self.labels[pos] or None
+
+    def size_of(self, pos):
+        """Return the size of the component of an empty cell."""
+        return self.sizes.get(self.labels[pos], 0)
+
+    def around(self, pos):
+        """Return the set of components next to ``pos``."""
+        labels = self.labels
+        return {labels[pos + d] for d in self.directions
+                if labels[pos + d]}
+
+    def space_around(self, pos):
+        """Return the number of empty cells reachable from ``pos``."""
+        return sum(self.sizes[comp] for comp in self.around(pos))
+
+    def connected(self, pos1, pos2):
+        """Return True if one can get from ``pos1`` to ``pos2``."""
+        return (pos2 - pos1 in self.directions or
+                bool(self.around(pos1) & self.around(pos2)))
+
+
+class RunLengths(GridTracker):
+    """Lengths of the free runs from every cell in every direction.
+
+    ``runs[direction][idx]`` is the number of empty cells passed going
+    straight from ``idx`` in ``direction`` (see ``TronGrid.DIRECTIONS``)
+    until the first obstacle. Filling or freeing a cell only updates the
+    runs of the cells behind it on its row and column.
+    """
+
+    def reset(self, grid):
+        cells = grid.grid
+        size = len(cells)
+        self.runs = {}
+        for direction in grid.DIRECTIONS.values():
+            runs = array('h', [0]) * size
+            if direction > 0:
+                order = xrange(size - 1 - direction, -1, -1)
+            else:
+                order = xrange(-direction, size)
+            for idx in order:
+                if cells[idx + direction] == 0:
+                    runs[idx] = runs[idx + direction] + 1
+            self.runs[direction] = runs
+
+    def update(self, grid, idx, old, new):
+        if (old == 0) == (new == 0):
+            return
+        cells = grid.grid
+        size = len(cells)
+        for direction, runs in self.runs.items():
+            run = runs[idx] + 1 if new == 0 else 0
+            pos = idx - direction
+            while 0 <= pos < size:
+                runs[pos] = run
+                if cells[pos] != 0:
+                    break
+                run += 1
+                pos -= direction
+
+    def replaced(self, grid, cells, src, dst):
+        if src == 0 or dst == 0:
+            self.reset(grid)
+
+
 class TronGrid(object):
 
     """Data structure for the field of the tron battle.
 
     Coordinates are mapped to indices like this:
 
-        idx = x + (y << 6)
+        idx = x + (y << shift)
 
     Then:
 
-        x = idx & 63
-        y = idx >> 6
+        x = idx & (stride - 1)
+        y = idx >> shift
 
-    The size of the grid is 30 x 20 with some padding to avoid overflows with
-    reasonably small moves. Initially the grid is filled with 0s for empty
-    cells and -1s for walls.
+    The size of the board is ``width`` x ``height`` (30 x 20 by default).
+    The rows are ``stride = 1 << shift`` cells long (64 unless the board is
+    wider, see ``row_shift``) and there are two rows of padding at the end
+    to avoid overflows with reasonably small moves. Initially the grid is
+    filled with 0s for empty cells and -1s for walls.
 
     The values in the grid are signed integers. Assigned values are:
 
@@ -65,6 +545,16 @@ class TronGrid(object):
         * 0 empty space
         * 1-4 body of tron #1-4
         * 5-8 head of tron #1-4
+
+    If ``indexed`` is true, the grid keeps the index of the cells for every
+    player value. Then ``replace``, ``cells_of`` and ``count_of`` for these
+    values only touch the cells that hold them.
+
+    If ``hashed`` is true, the grid keeps its Zobrist hash up to date (see
+    ``position_hash``).
+
+    If ``run_lengths`` is true, the grid keeps the lengths of the free runs
+    from every cell (see ``free_run``).
     """
 
     DIRECTIONS = {
@@ -74,27 +564,133 @@ class TronGrid(object):
             'RIGHT': 1
     }
 
-    def __init__(self):
-        self.grid = array('h', ([0] * 30 + [-1] * 34) * 20 + [-1] * 128)
+    #: Geometry of the default board. Grids of other sizes get their own
+    #: values (and ``DIRECTIONS``) as instance attributes, so the default
+    #: grids stay as cheap to copy as they were.
+    width = WIDTH
+    height = HEIGHT
+    shift = row_shift(WIDTH)
+    stride = 1 << shift
+
+    #: Cache of the ray cone tables (see ``ray_cone``).
+    RAY_CONES = {}
+    #: Cache of the empty grids by board size.
+    EMPTY_GRIDS = {(WIDTH, HEIGHT): EMPTY_GRID}
+
+    def __init__(self, indexed=False, hashed=False, run_lengths=False,
+            width=WIDTH, height=HEIGHT):
+        key = width, height
+        if key != (WIDTH, HEIGHT):
+            self.width = width
+            self.height = height
+            self.shift = row_shift(width)
+            self.stride = stride = 1 << self.shift
+            self.DIRECTIONS = {'UP': -stride, 'DOWN': stride, 'LEFT': -1,
+                    'RIGHT': 1}
+        if key not in self.EMPTY_GRIDS:
+            self.EMPTY_GRIDS[key] = empty_grid(width, height)
+        self.grid = self.EMPTY_GRIDS[key][:]
+        self.trackers = []
+        self.cell_index = None
+        if indexed:
+            self.cell_index = self.add_tracker(CellIndex())
+        self.zobrist = None
+        if hashed:
+            self.zobrist = self.add_tracker(ZobristHash())
+        self.run_lengths = None
+        if run_lengths:
+            self.run_lengths = self.add_tracker(RunLengths())
 
     def copy(self):
-        return deepcopy(self)
+        trackers = self.trackers
+        self.trackers = [tracker for tracker in trackers if tracker.copied]
+        try:
+            return deepcopy(self)
+        finally:
+            self.trackers = trackers
 
     def __str__(self):
         ret = []
-        for start in range(0, 64 * 20, 64):
+        for start in range(0, self.height << self.shift, self.stride):
             cells = ['{: >-2d}'.format(cell) if cell else '  '
-                    for cell in self.grid[start:start + 30]]
+                    for cell in self.grid[start:start + self.width]]
             ret.append(' '.join(cells))
         ret = ['#' * len(ret[0])] + ret + ['#' * len(ret[0])]
         ret = ['#' + l + '#' for l in ret]
         return '\n'.join(ret)
 
+    def pack(self):
+        """Return the playing area packed into a string, 4 bits per cell.
+
+        The cells go row by row, two cells per byte with the first one in the
+        high nibble. Walls are stored as 15. If the number of cells is odd,
+        the last low nibble is 0. See ``unpack``.
+
+        Raises ValueError if some cell is not a wall and doesn't fit into 4
+        bits (is above ``MAX_PACKED_CELL``).
+        """
+        data = self.grid.tostring()
+        raw = data[LOW_BYTE::2]
+        high = data[1 - LOW_BYTE::2]
+        if raw.translate(LOW2HIGH) != high or '\1' in high:
+            raise ValueError('Cells must be from -1 to {} to be packed'
+                    .format(MAX_PACKED_CELL))
+        width = self.width
+        cells = ''.join(raw[start:start + width]
+                for start in xrange(0, self.height << self.shift, self.stride))
+        if len(cells) & 1:
+            cells += '\0'
+        return cells.translate(CELL2HEX).decode('hex')
+
+    @classmethod
+    def unpack(cls, data, indexed=False, hashed=False, run_lengths=False,
+            width=WIDTH, height=HEIGHT):
+        """Make a grid of the given size from the string returned by
+        ``pack``."""
+        packed_size = (width * height + 1) // 2
+        if len(data) != packed_size:
+            raise ValueError('Packed grid must be {} bytes long, got {}'
+                    .format(packed_size, len(data)))
+        tg = cls(indexed, hashed, run_lengths, width, height)
+        cells = ''.join(map(HEX2CELL.__getitem__, data.encode('hex')))
+        row_size = len(WALL_CELL) * width
+        rows = [cells[start:start + row_size]
+                for start in xrange(0, row_size * height, row_size)]
+        row_padding = WALL_CELL * (tg.stride - width)
+        tg.grid = array('h', row_padding.join(rows) + row_padding +
+                WALL_CELL * (tg.stride * 2))
+        for tracker in tg.trackers:
+            tracker.reset(tg)
+        return tg
+
     def __getitem__(self, idx):
         return self.grid[idx]
 
     def __setitem__(self, idx, value):
+        old = self.grid[idx]
         self.grid[idx] = value
+        for tracker in self.trackers:
+            tracker.update(self, idx, old, value)
+
+    def add_tracker(self, tracker):
+        """Attach a ``GridTracker`` and build its data."""
+        self.trackers.append(tracker)
+        tracker.reset(self)
+        return tracker
+
+    def position_hash(self, player_to_move=None):
+        """Return the 64-bit hash of the position.
+
+        If ``player_to_move`` is given, it's included in the hash. The hash
+        is computed from scratch unless the grid is ``hashed``.
+        """
+        zobrist = self.zobrist
+        if zobrist is None:
+            zobrist = ZobristHash()
+            zobrist.reset(self)
+        if player_to_move is None:
+            return zobrist.value
+        return zobrist.with_side(player_to_move)
 
     @staticmethod
     def head_of(player_number):
@@ -104,16 +700,14 @@ class TronGrid(object):
     def body_of(player_number):
         return player_number + 4
 
-    @staticmethod
-    def coords2index(x, y):
-        return x + (y << 6)
+    def coords2index(self, x, y):
+        return x + (y << self.shift)
 
-    @staticmethod
-    def index2coords(idx):
-        return idx & 63, idx >> 6
+    def index2coords(self, idx):
+        return idx & (self.stride - 1), idx >> self.shift
 
     def put(self, x, y, value):
-        self.grid[self.coords2index(x, y)] = value
+        self[self.coords2index(x, y)] = value
 
     def get(self, x, y):
         return self.grid[self.coords2index(x, y)]
@@ -128,14 +722,72 @@ class TronGrid(object):
         for x in xrange(x0, x1 + 1):
             self.put(x, y, value)
 
+    def cells_of(self, value):
+        """Return the set of positions that hold ``value``."""
+        if value > 0 and self.cell_index is not None:
+            return set(self.cell_index.cells.get(value, ()))
+        return {i for i, v in enumerate(self.grid) if v == value}
+
+    def count_of(self, value):
+        """Return the number of cells that hold ``value``."""
+        if value > 0 and self.cell_index is not None:
+            return len(self.cell_index.cells.get(value, ()))
+        return self.grid.count(value)
+
     def replace(self, src, dst):
-        for i, value in enumerate(self.grid):
-            if value == src:
-                self.grid[i] = dst
+        grid = self.grid
+        if src > 0 and self.cell_index is not None:
+            cells = list(self.cell_index.cells.get(src, ()))
+        else:
+            cells = [i for i, value in enumerate(grid) if value == src]
+        for i in cells:
+            grid[i] = dst
+        for tracker in self.trackers:
+            tracker.replaced(self, cells, src, dst)
+
+    def apply_move(self, player_number, new_pos):
+        """Move the head of the player to ``new_pos``.
+
+        The old head becomes the body. Returns the token for ``undo``.
+        """
+        head = self.head_of(player_number)
+        for head_pos in self.neighbours_of(new_pos):
+            if self.grid[head_pos] == head:
+                break
+        else:
+            raise ValueError('Head of player {} is not next to {}'.format(
+                player_number, new_pos))
+        token = (head_pos, new_pos, self.grid[new_pos])
+        self[new_pos] = head
+        self[head_pos] = self.body_of(player_number)
+        return token
+
+    def undo(self, token):
+        """Take back the move made by ``apply_move``."""
+        head_pos, new_pos, value = token
+        self[head_pos] = self.grid[new_pos]
+        self[new_pos] = value
+
+    def free_run(self, pos, direction):
+        """Return the number of empty cells straight from ``pos``.
+
+        It's a lookup if the grid keeps the run lengths, otherwise the cells
+        are walked.
+        """
+        if self.run_lengths is not None:
+            return self.run_lengths.runs[direction][pos]
+        grid = self.grid
+        run = 0
+        pos += direction
+        while grid[pos] == 0:
+            run += 1
+            pos += direction
+        return run
 
     def neighbours_of(self, pos):
         """Return the list of the neighbours of a position."""
-        return [pos - 64, pos - 1, pos + 1, pos + 64]
+        stride = self.stride
+        return [pos - stride, pos - 1, pos + 1, pos + stride]
 
     def bfs_fill(self, value, origins):
         grid = self.grid
@@ -152,7 +804,10 @@ class TronGrid(object):
                     grid[pos] = value
                     add_to_wave(pos)
 
-    def bfs_probe(self, start_pos, limit=None):
+        for tracker in self.trackers:
+            tracker.reset(self)
+
+    def bfs_probe(self, start_pos, limit=None, lean=False):
         """See how far we can get from the ``start_pos``.
 
         Returns the information about the surroundings of that point:
@@ -162,88 +817,361 @@ class TronGrid(object):
             * List of objects encountered and the distances to them,
 
         If ``limit`` is specified, don't probe beyond that many steps.
+
+        If ``lean`` is true, only the max distance and the number of empty
+        positions are returned: the objects and the distances to passed
+        positions are not recorded.
         """
-        marker = 32000
         directions = self.DIRECTIONS.values()
         grid = copy(self.grid)  # Don't change the original grid.
-        grid[start_pos] = marker
+        grid[start_pos] = mark = DISTANCE_MARK
         origins = [start_pos]
         steps = 0
         empty_count = 0
+        odd_count = 0
         obj2dist = {}
         obj2pos = {}
-        layers = []
 
         while origins:
-            layers.append(origins)
             steps += 1
             if limit is not None and steps > limit:
                 break
 
+            mark += 1
             new_origins = []
             add_new_origin = new_origins.append
 
-            for origin in origins:
-                for d in directions:
-                    pos = origin + d
-                    value = grid[pos]
-                    if value == marker:
-                        pass
-                    elif value == 0:
-                        grid[pos] = marker
-                        add_new_origin(pos)
-                        empty_count += 1
-                    else:
-                        if value not in obj2dist:
+            if lean:
+                for origin in origins:
+                    for d in directions:
+                        pos = origin + d
+                        if grid[pos] == 0:
+                            grid[pos] = mark
+                            add_new_origin(pos)
+            else:
+                for origin in origins:
+                    for d in directions:
+                        pos = origin + d
+                        value = grid[pos]
+                        if value == 0:
+                            grid[pos] = mark
+                            add_new_origin(pos)
+                        elif value < DISTANCE_MARK and value not in obj2dist:
                             obj2dist[value] = steps
                             obj2pos[value] = pos
 
+            empty_count += len(new_origins)
+            if steps & 1:
+                odd_count += len(new_origins)
             origins = new_origins
 
-        return ProbeResult(steps - 1, empty_count, obj2dist, obj2pos, layers)
+        if lean:
+            return ProbeResult(steps - 1, empty_count, obj2dist, obj2pos,
+                    odd_count=odd_count)
+        return ProbeResult(steps - 1, empty_count, obj2dist, obj2pos,
+                distances=grid, odd_count=odd_count)
+
+    def fillable(self, start_pos, limit=None):
+        """Return the parity-corrected bound of the moves from ``start_pos``.
+
+        See ``ProbeResult.fillable``.
+        """
+        return self.bfs_probe(start_pos, limit, lean=True).fillable
+
+    def chambers(self, start_pos):
+        """Split the space reachable from ``start_pos`` into chambers.
+
+        Finds the cut cells and the chambers between them with one DFS
+        (Tarjan's algorithm). Returns the root of the tree of chambers: a
+        ``Chamber`` with no entrance and no cells whose children are the
+        chambers entered from ``start_pos``.
+        """
+        grid = self.grid
+        directions = self.DIRECTIONS.values()
+        disc = {start_pos: 0}
+        low = {start_pos: 0}
+        cell_stack = []
+        entered_via = defaultdict(list)  # cut cell -> chambers behind it
+        work = [(start_pos, iter(directions))]
+
+        while work:
+            pos, dirs = work[-1]
+            for d in dirs:
+                next_pos = pos + d
+                if next_pos in disc:
+                    if disc[next_pos] < low[pos]:
+                        low[pos] = disc[next_pos]
+                elif grid[next_pos] == 0:
+                    disc[next_pos] = low[next_pos] = len(disc)
+                    cell_stack.append(next_pos)
+                    work.append((next_pos, iter(directions)))
+                    break
+            else:
+                work.pop()
+                if not work:
+                    break
+                parent = work[-1][0]
+                if low[pos] < low[parent]:
+                    low[parent] = low[pos]
+                if low[pos] >= disc[parent]:
+                    cells = []
+                    while not cells or cells[-1] != pos:
+                        cells.append(cell_stack.pop())
+                    children = []
+                    for cell in cells:
+                        if cell in entered_via:
+                            children.extend(entered_via.pop(cell))
+                    entered_via[parent].append(
+                            Chamber(parent, cells, children))
+
+        return Chamber(None, [], entered_via.pop(start_pos, []))
+
+    def voronoi(self, heads, limit=None):
+        """Split the empty space between the players.
+
+        Runs one BFS from all the heads at once. Every empty cell goes to
+        the player that can reach it first, the cells that several players
+        can reach at the same time are ties.
+
+        :param dict heads: Positions of the heads by player number.
+        :param int limit: Don't go beyond that many steps.
+        :return: ``VoronoiResult``.
+        """
+        # Reached cells are marked with the layer number and the label:
+        # player number + 1 or 0 for ties.
+        base = 1024
+        directions = self.DIRECTIONS.values()
+        if base + (self.width * self.height << 3) < 32768:
+            grid = copy(self.grid)  # Don't change the original grid.
+        else:
+            grid = array('i', self.grid)  # Layer marks don't fit in 'h'.
+        for player, pos in heads.items():
+            grid[pos] = base + player + 1
+        front = heads.values()
+        reached = []
+        steps = 0
+
+        while front:
+            steps += 1
+            if limit is not None and steps > limit:
+                break
+            layer = base + (steps << 3)
+            new_front = []
+            add_to_front = new_front.append
+
+            for origin in front:
+                label = grid[origin] & 7
+                for d in directions:
+                    pos = origin + d
+                    value = grid[pos]
+                    if value == 0:
+                        grid[pos] = layer + label
+                        add_to_front(pos)
+                    elif value > layer and value != layer + label:
+                        grid[pos] = layer
+
+            reached.extend(new_front)
+            front = new_front
+
+        owners = [None] + range(7)
+        labels = {pos: owners[grid[pos] & 7] for pos in reached}
+        return VoronoiResult(labels, heads, directions)
+
+    def bfs_probe_many(self, origins, limit=None, lean=False):
+        """Probe from several start positions in one pass.
+
+        Returns the list of ``ProbeResult``s, one per origin, same as
+        ``bfs_probe`` would but without the layers. The waves from all
+        origins are expanded together as a stack of NumPy masks. Without
+        NumPy it just calls ``bfs_probe`` for each origin.
+        """
+        if numpy is None or not origins:
+            return [self.bfs_probe(pos, limit, lean) for pos in origins]
+
+        # Flattened field with the rows of ``cols`` cells. Field cells (x, y)
+        # are at (x + 1, y + 2): there's a column of walls on the left and on
+        # the right and two rows of walls above and below (the outer rows are
+        # there so that shifted slices never go out of bounds).
+        width, height, shift = self.width, self.height, self.shift
+        cols = width + 2
+        size = cols * (height + 4)
+        values = numpy.full((height + 4, cols), -1, numpy.int16)
+        board = numpy.frombuffer(self.grid, numpy.int16).reshape(-1,
+                self.stride)
+        values[2:height + 2, 1:width + 1] = board[:height, :width]
+        values = values.reshape(size)
+
+        # Masks are stacked along the last axis: mask[cell, origin_no].
+        count = len(origins)
+        x_mask = self.stride - 1
+        starts = [(pos & x_mask) + 1 + ((pos >> shift) + 2) * cols
+                for pos in origins]
+        front = numpy.zeros((size, count), bool)
+        front[starts, numpy.arange(count)] = True
+        free = front | (values == 0)[:, None]
+        avail = free & ~front
+        dist = numpy.zeros((size, count), numpy.int16)
+        around = numpy.zeros_like(front)
+        inner = around[cols:-cols]
+        left, right, up, down = (front[cols - 1:-cols - 1],
+                front[cols + 1:-cols + 1], front[:-cols * 2],
+                front[cols * 2:])
+        steps = 0
+
+        while limit is None or steps < limit:
+            steps += 1
+            numpy.logical_or(left, right, out=inner)
+            inner |= up
+            inner |= down
+            numpy.logical_and(around, avail, out=front)
+            if not front.any():
+                break
+            avail ^= front
+            dist[front] = steps
+
+        visited = free & ~avail
+        max_distance = numpy.where(visited, dist, 0).max(axis=0).tolist()
+        empty_counts = (visited.sum(axis=0) - 1).tolist()
+        odd_counts = (visited & (dist & 1).astype(bool)).sum(axis=0).tolist()
+        if lean:
+            return [ProbeResult(max_distance[i], empty_counts[i], {}, {},
+                    odd_count=odd_counts[i]) for i in xrange(count)]
+
+        # Obstacles are one step further than their closest visited
+        # neighbour.
+        far = numpy.int16(steps + 1)
+        dist[~visited] = far
+        near = numpy.full((size, count), far, numpy.int16)
+        near_inner = near[cols:-cols]
+        numpy.minimum(dist[cols - 1:-cols - 1], dist[cols + 1:-cols + 1],
+                out=near_inner)
+        numpy.minimum(near_inner, dist[:-cols * 2], out=near_inner)
+        numpy.minimum(near_inner, dist[cols * 2:], out=near_inner)
+        near += 1
+        cells, origin_nos = numpy.nonzero(~free & (near <= steps))
+        objs = values[cells]
+        dists = near[cells, origin_nos]
+        order = numpy.lexsort((dists, objs, origin_nos))
+        _, first = numpy.unique(origin_nos[order] * 64 + objs[order],
+                return_index=True)
+        first = order[first]
+
+        obj2dists = [{} for i in xrange(count)]
+        obj2poses = [{} for i in xrange(count)]
+        for i, obj, d, cell in zip(origin_nos[first].tolist(),
+                objs[first].tolist(), dists[first].tolist(),
+                cells[first].tolist()):
+            obj2dists[i][obj] = d
+            obj2poses[i][obj] = cell % cols - 1 + ((cell // cols - 2) << shift)
+
+        return [ProbeResult(max_distance[i], empty_counts[i], obj2dists[i],
+                obj2poses[i], odd_count=odd_counts[i]) for i in xrange(count)]
+
+    def ray_cone(self, direction, width):
+        """Return the cone table for the rays in ``direction`` of ``width``.
+
+        The cone is relative to the start point, so one table serves all
+        start points. The table is ``(side, flip, widen)``: positive step
+        across the ray, whether the lanes are ordered against ``side`` and
+        the flags of the steps on which the cone widens. The tables are
+        built once and cached on the class.
+        """
+        steps = max(self.stride, self.height)
+        key = direction, width, self.stride, steps
+        if key not in self.RAY_CONES:
+            open_directions = [dir for dir in self.DIRECTIONS.values()
+                    if dir != direction and dir != -direction]
+            add_pix = 0.0
+            widen = [False]
+            for step in xrange(steps):
+                add_pix += width / 10.0
+                widen.append(add_pix > 1)
+                if add_pix > 1:
+                    add_pix -= 1
+            side = abs(open_directions[0])
+            self.RAY_CONES[key] = side, open_directions[0] > 0, tuple(widen)
+        return self.RAY_CONES[key]
 
     def ray_probe(self, start_pos, direction, width=0, limit=None):
         """See how far we can go in the given direction.
 
+        The cone of the ray is made of parallel lanes that stop at the first
+        obstacle; every few steps it widens by a lane on each side of the
+        outermost open lanes. The cells of the lanes on each step are read as
+        one slice of the grid.
+
         :param int start_pos: Start point.
         :param int direction: Direction (see ``TronGrid.DIRECTIONS``).
         :param int width: How much the ray opens per 10 pixels (maximum 10).
         :param int limit: Limit for the scanning distance.
 
-        :return: ``ProbeResult`` with results of the scan.
+        :return: ``RayProbeResult`` with results of the scan.
         """
-        front = [start_pos]
-        open_directions = [dir for dir in self.DIRECTIONS.values()
-                if dir != direction and dir != -direction]
+        grid = self.grid
+        side, flip, widen = self.ray_cone(direction, width)
+        if limit is None:
+            limit = len(widen) - 1
+        limit = min(limit, len(widen) - 1)
+        base = start_pos
+        lo = hi = 0
+        lanes = None  # None while all the lanes from lo to hi are open.
         steps = 0
-        add_pix = 0.0
         empty_count = 0
         obj2dist = {}
         obj2pos = {}
-        layers = []
+        rows = []
 
-        while front:
-            layers.append(front)
+        while True:
+            rows.append((base, lo, hi, lanes))
             steps += 1
-            if limit is not None and steps > limit:
+            if steps > limit:
                 break
-            add_pix += width / 10.0
-            new_front = [pt + direction for pt in front]
-            if add_pix > 1:
-                add_pix -= 1
-                new_front = [new_front[0] + open_directions[0]] + new_front +\
-                            [new_front[-1] + open_directions[1]]
-            front = []
-            for pt in new_front:
-                value = self.grid[pt]
+            base += direction
+            if widen[steps]:
+                lo -= 1
+                hi += 1
+                if lanes is not None:
+                    lanes = [lo] + lanes + [hi]
+
+            first = base + lo * side
+            if first < 0:
+                # Above the top row, negative indices wrap to the padding.
+                values = [grid[first + lane * side]
+                        for lane in xrange(hi - lo + 1)]
+            elif lo == hi:
+                values = grid[first],
+            else:
+                values = grid[first:base + hi * side + 1:side]
+            if lanes is None and not any(values):
+                empty_count += hi - lo + 1
+                continue
+
+            if lanes is None:
+                lanes = range(lo, hi + 1)
+            open_lanes = []
+            for lane in (reversed(lanes) if flip else lanes):
+                value = values[lane - lo]
                 if value == 0:
-                    front.append(pt)
-                else:
-                    if value not in obj2dist:
-                        obj2dist[value] = steps
-                        obj2pos[value] = pt
+                    open_lanes.append(lane)
+                elif value not in obj2dist:
+                    obj2dist[value] = steps
+                    obj2pos[value] = base + lane * side
+            if not open_lanes:
+                break
+            if flip:
+                open_lanes.reverse()
+            lo = open_lanes[0]
+            hi = open_lanes[-1]
+            lanes = open_lanes if len(open_lanes) < hi - lo + 1 else None
+            empty_count += len(open_lanes)
 
-            empty_count += len(front)
-            # print steps, front, empty_count
+        return RayProbeResult(steps - 1, empty_count, obj2dist, obj2pos,
+                rows, side, flip)
 
-        return ProbeResult(steps - 1, empty_count, obj2dist, obj2pos, layers)
+    def ray_probe_all(self, start_pos, width=0, limit=None):
+        """Do ``ray_probe`` in all four directions.
+
+        :return: dict of ``RayProbeResult`` by direction name.
+        """
+        return {name: self.ray_probe(start_pos, direction, width, limit)
+                for name, direction in self.DIRECTIONS.items()}
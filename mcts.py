@@ -0,0 +1,224 @@
+"""
+Monte Carlo tree search.
+"""
+
+import math
+import random
+import time
+from operator import attrgetter
+
+
+#: Exploration constant of the UCT selection (the rewards are from 0 to 1).
+EXPLORATION = 0.7
+
+
+class Node(object):
+    """Node of the search tree: the position after a move.
+
+    Like the states of ``MiniMax`` the nodes keep only the move that led to
+    them, the grid and the positions of the players are made on the way
+    down from the root. ``reward`` is the sum of the rewards of the player
+    who made the move over the playouts that went through the node.
+    """
+
+    __slots__ = ('player_number', 'direction', 'pos', 'parent', 'children',
+            'untried', 'visits', 'reward')
+
+    def __init__(self, player_number, direction, pos, parent=None):
+        self.player_number = player_number
+        self.direction = direction
+        self.pos = pos
+        self.parent = parent
+        self.children = []
+        #: Moves that don't have their nodes yet as (direction, position),
+        #: None until the node is reached for the first time.
+        self.untried = None
+        self.visits = 0
+        self.reward = 0.0
+
+    def __repr__(self):
+        return '[{}:{} {:.3f}/{}]'.format(self.player_number, self.direction,
+                self.reward, self.visits)
+
+
+class MCTS(object):
+    """Monte Carlo tree search with the UCT selection.
+
+    The players in our pocket move in turns starting with us (the others
+    can't interact with us and are ignored). Every playout goes down the
+    tree choosing the moves by UCT, adds one node and then plays the game
+    out with the ``playout`` policy on a copy of the cells until only one
+    player is left. The player that can't move is dead, its trail stays on
+    the grid. The reward of the player is the share of the other players
+    that died before it (and half of the share of the ones that survived
+    as well).
+    """
+
+    def __init__(self, grid, player, full_bfs=None, playout='random',
+            exploration=EXPLORATION, seed=None):
+        """Initialize the search.
+
+        :param TronGrid grid: grid before the move.
+        :param Player player: us.
+        :param str playout: Policy of the playouts: 'random' (random free
+            cell) or 'hug' (free cell with the most obstacles around, see
+            ``policy_hug``).
+        :param float exploration: Exploration constant of UCT.
+        :param seed: Seed of the random numbers of the playouts.
+        """
+        self.grid = grid
+        self.my_number = player.number
+        self.my_pos = grid.coords2index(player.x1, player.y1)
+        if full_bfs is None:
+            full_bfs = grid.bfs_probe(self.my_pos)
+        self.positions = [None] * 4
+        self.positions[self.my_number] = self.my_pos
+        for i in xrange(4):
+            head = grid.head_of(i)
+            if i != self.my_number and head in full_bfs.objects:
+                self.positions[i] = full_bfs.obj2pos[head]
+        #: Players in the order of the moves, starting with us.
+        self.order = [(self.my_number + i) % 4 for i in xrange(4)
+                if self.positions[(self.my_number + i) % 4] is not None]
+        self.offsets = grid.DIRECTIONS.items()
+        self.policy = getattr(self, 'policy_' + playout)
+        self.exploration = exploration
+        self.random = random.Random(seed)
+        self.root = Node(None, None, self.my_pos)
+        #: Number of the playouts made.
+        self.playouts = 0
+
+    def find_best_move(self, playouts=None, time_limit=None):
+        """Make ``playouts`` or play out until ``time_limit`` (in ms) runs
+        out, whichever comes first (one of them must be given).
+
+        Returns the average reward of the most visited move and the move.
+        """
+        if playouts is None and not time_limit:
+            raise ValueError('Playouts or time limit must be given')
+        if time_limit:
+            deadline = time.time() + time_limit / 1000.0
+        count = 0
+        while playouts is None or count < playouts:
+            if time_limit and time.time() > deadline:
+                break
+            self.run_playout()
+            count += 1
+
+        if not self.root.children:
+            return 0, None
+        best = max(self.root.children, key=attrgetter('visits'))
+        return best.reward / best.visits, best.direction
+
+    def moves_of(self, cells, pos):
+        """Return the moves from ``pos`` as (direction, position)."""
+        return [(dir, pos + offset) for dir, offset in self.offsets
+                if cells[pos + offset] == 0]
+
+    def select(self, node):
+        """Return the child of the node with the best UCT value."""
+        log_visits = math.log(node.visits)
+        exploration = self.exploration
+
+        def uct(child):
+            return (child.reward / child.visits +
+                    exploration * math.sqrt(log_visits / child.visits))
+
+        return max(node.children, key=uct)
+
+    def run_playout(self):
+        """Go down the tree, add a node, play out and update the nodes."""
+        cells = self.grid.grid[:]
+        positions = list(self.positions)
+        order = self.order
+        node = self.root
+        path = []
+        turn = 0
+        while node.untried == [] and node.children:
+            node = self.select(node)
+            cells[node.pos] = 1
+            positions[node.player_number] = node.pos
+            path.append(node)
+            turn += 1
+
+        number = order[turn % len(order)]
+        if node.untried is None:
+            node.untried = self.moves_of(cells, positions[number])
+        if node.untried:
+            idx = self.random.randrange(len(node.untried))
+            dir, pos = node.untried.pop(idx)
+            node = Node(number, dir, pos, node)
+            node.parent.children.append(node)
+            cells[pos] = 1
+            positions[number] = pos
+            path.append(node)
+            turn += 1
+
+        rewards = self.play_out(cells, positions, turn)
+        self.root.visits += 1
+        for node in path:
+            node.visits += 1
+            node.reward += rewards[node.player_number]
+        self.playouts += 1
+
+    def play_out(self, cells, positions, turn):
+        """Play the game out from the turn of ``order[turn]``, return the
+        rewards of the players."""
+        order = self.order
+        alive = order[turn % len(order):] + order[:turn % len(order)]
+        died = {}
+        step = 0
+        while len(alive) > 1:
+            for number in list(alive):
+                new_pos = self.policy(cells, positions[number])
+                if new_pos is None:
+                    alive.remove(number)
+                    died[number] = step
+                    if len(alive) == 1:
+                        break
+                else:
+                    cells[new_pos] = 1
+                    positions[number] = new_pos
+                step += 1
+
+        rewards = [0.0] * 4
+        if len(order) == 1:
+            rewards[order[0]] = 1.0
+            return rewards
+        for number in order:
+            end = died.get(number, step + 1)
+            for other in order:
+                if other != number:
+                    other_end = died.get(other, step + 1)
+                    if other_end < end:
+                        rewards[number] += 1
+                    elif other_end == end:
+                        rewards[number] += 0.5
+            rewards[number] /= len(order) - 1
+        return rewards
+
+    def policy_random(self, cells, pos):
+        """Return a random free cell next to ``pos`` (None if none)."""
+        free = [pos + offset for dir, offset in self.offsets
+                if cells[pos + offset] == 0]
+        if free:
+            return self.random.choice(free)
+        return None
+
+    def policy_hug(self, cells, pos):
+        """Return the free cell next to ``pos`` with the most obstacles
+        around it (the random one of them if several, None if none)."""
+        best = []
+        most = -1
+        for dir, offset in self.offsets:
+            new_pos = pos + offset
+            if cells[new_pos] == 0:
+                around = [cells[new_pos + o] for d, o in self.offsets]
+                obstacles = 4 - around.count(0)
+                if obstacles > most:
+                    best, most = [new_pos], obstacles
+                elif obstacles == most:
+                    best.append(new_pos)
+        if best:
+            return self.random.choice(best)
+        return None
@@ -2,10 +2,23 @@
 MiniMax algorithm.
 """
 
+import time
+from itertools import groupby
+from operator import attrgetter
+
+
+#: Bound of the values of the positions.
+INFINITY = 1000
+#: Half-width of the aspiration window around the guessed value in the
+#: alpha-beta search.
+ASPIRATION = 10
+
 
 class Move(object):
     """Move record."""
 
+    __slots__ = ('player_number', 'is_mine', 'direction')
+
     def __init__(self, player_number, is_mine, direction):
         """Move record.
 
@@ -21,41 +34,172 @@ class Move(object):
         return '{}:{}'.format(self.player_number, self.direction)
 
 
+class TranspositionTable(object):
+    """Bounded table of the values of the searched positions.
+
+    Entries are kept in ``size`` slots by the position hash (with the player
+    to move, see ``TronGrid.position_hash``) as ``(key, depth, value, bound,
+    move, generation)``: ``value`` was found searching ``depth`` plies below
+    the position and it's exact or a lower or upper bound; ``move`` is the
+    best move found. A slot is taken over by the entries of deeper searches
+    or newer generations (see ``new_generation``).
+
+    In Tron the trails of the players record the order of their moves, so
+    one search never reaches the same position twice. The table pays off
+    across the searches: the iterations of the iterative deepening and the
+    searches on the following turns.
+    """
+
+    EXACT = 0
+    LOWER = 1
+    UPPER = 2
+
+    def __init__(self, size=65536):
+        self.size = size
+        self.slots = [None] * size
+        self.generation = 0
+        self.hits = 0
+
+    def new_generation(self):
+        """Let the following searches replace the current entries."""
+        self.generation += 1
+
+    def get(self, key):
+        """Return the entry of the position (None if it's not there)."""
+        entry = self.slots[key % self.size]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def put(self, key, depth, value, bound, move=None):
+        """Store the entry of the position unless a more valuable one of
+        another position takes its slot."""
+        slot = key % self.size
+        entry = self.slots[slot]
+        if (entry is None or entry[0] == key or entry[1] <= depth or
+                entry[5] != self.generation):
+            self.slots[slot] = (key, depth, value, bound, move,
+                    self.generation)
+
+
 class State(object):
-    """State after several moves."""
+    """State after several moves.
 
-    def __init__(self, moves, grid, player2pos, next_player, prev_state=None):
-        self.moves = moves
-        self.grid = grid
-        self.player2pos = player2pos
+    The states are the nodes of the tree and there are many of them, so
+    they are kept small: the state has only the last move (the ones before
+    it are in the previous states) and the positions of the players as a
+    tuple indexed by the player number. Only the root keeps a grid, the
+    grids of the other states are made from the grid of the root and the
+    moves when they are needed (see ``grid``).
+    """
+
+    __slots__ = ('move', 'positions', 'next_player', 'prev_state',
+            'next_states', 'value', 'root_grid')
+
+    def __init__(self, move, positions, next_player, prev_state=None,
+            root_grid=None):
+        self.move = move
+        self.positions = positions
         self.next_player = next_player
         self.prev_state = prev_state
         self.next_states = []
         self.value = 0
+        self.root_grid = root_grid
 
     def __repr__(self):
         return '[{}->{}]'.format(self.moves, self.value)
 
+    @property
+    def moves(self):
+        """Moves from the root to this state."""
+        moves = []
+        state = self
+        while state.move is not None:
+            moves.append(state.move)
+            state = state.prev_state
+        return moves[::-1]
+
+    @property
+    def player2pos(self):
+        """Positions of the players as a dict."""
+        return {number: pos for number, pos in enumerate(self.positions)
+                if pos is not None}
+
     @property
     def player_number(self):
         """Number of the player that moved last."""
-        return self.moves[-1].player_number
+        return self.move.player_number
 
-    def add_next_state(self, next_state):
-        """Add next state to the state tree."""
+    @property
+    def grid(self):
+        """Grid of the state.
+
+        The root returns its grid, the other states return a new copy of
+        it with the moves made on it.
+        """
+        if self.root_grid is not None:
+            return self.root_grid
+        path = []
+        state = self
+        while state.root_grid is None:
+            path.append(state)
+            state = state.prev_state
+        grid = state.root_grid.copy()
+        for state in reversed(path):
+            number = state.move.player_number
+            grid[state.prev_state.positions[number]] = grid.body_of(number)
+            grid[state.positions[number]] = grid.head_of(number)
+        return grid
+
+    def next_state(self, move, new_pos, next_player):
+        """Add the state after ``move`` to ``new_pos`` and return it."""
+        positions = list(self.positions)
+        positions[move.player_number] = new_pos
+        next_state = State(move, tuple(positions), next_player, self)
         self.next_states.append(next_state)
+        return next_state
 
 
 class MiniMax(object):
     """MiniMax."""
 
-    def __init__(self, grid, player, full_bfs=None):
+    def __init__(self, grid, player, full_bfs=None, in_place=False,
+            evaluation='volume', alpha_beta=False, table=None,
+            best_reply=False):
         """Initialize the algorithm.
 
         :param TronGrid grid: grid before the move.
         :param Player player: index
+        :param bool in_place: Search depth-first making and taking back the
+            moves on ``grid`` instead of building the tree of states with
+            grid copies.
+        :param bool alpha_beta: Search depth-first on ``grid`` (like
+            ``in_place``) with alpha-beta pruning, see
+            ``find_best_move_alpha_beta``.
+        :param TranspositionTable table: Table of the values of the
+            positions to use and fill (the grid must be ``hashed``). The
+            leaf evaluations are cached in it and the alpha-beta search
+            also takes the cut-offs and the best moves from it.
+        :param bool best_reply: Best-reply search: my plies alternate with
+            the plies of the opponents where only one of them moves (any
+            of them, so the most dangerous reply is found), the others
+            stay. With several opponents the search goes much deeper for
+            the same number of states.
+        :param str evaluation: How to evaluate the leaf states: 'volume'
+            (separate BFS probe for each player, see ``evaluate_volume``),
+            'fillable' (same with the parity correction, see
+            ``evaluate_fillable``) or 'voronoi' (split the space between the
+            players with one BFS, see ``evaluate_voronoi``).
         """
+        if table is not None and grid.zobrist is None:
+            raise ValueError('Transposition table needs a hashed grid')
         self.grid = grid
+        self.in_place = in_place
+        self.alpha_beta = alpha_beta
+        self.table = table
+        self.best_reply = best_reply
+        self.evaluate = getattr(self, 'evaluate_' + evaluation)
         self.my_number = player.number
         self.my_pos = grid.coords2index(player.x1, player.y1)
         if full_bfs is None:
@@ -64,21 +208,346 @@ class MiniMax(object):
         self.detect_opponents()
         self.create_init_state()
         self.layers = []
+        #: Number of the positions visited by the depth-first searches.
+        self.node_count = 0
+        #: Killer moves of the alpha-beta search by ply.
+        self.killers = []
+        #: Time (``time.time()``) when the alpha-beta search must stop.
+        self.deadline = None
+        #: ``node_count`` at which the alpha-beta search must stop.
+        self.node_limit = None
+        self.timed_out = False
+        #: Whether the alpha-beta search evaluated any position at the full
+        #: depth or took a value from the table (otherwise every line ended
+        #: earlier).
+        self.leaf_reached = False
+        #: Last depth completed by ``find_best_move_iterative``.
+        self.completed_depth = 0
 
-    def find_best_move(self, max_layers=5, max_layer_size=60):
-        """Find the best move by analyzing at most max_layers."""
-        for i in xrange(max_layers):
-            self.compute_next_layer()
-            if len(self.layers[-1]) > max_layer_size:
+    def find_best_move(self, max_layers=5, max_layer_size=60, guess=None,
+            time_limit=None, max_nodes=None):
+        """Find the best move by analyzing at most max_layers.
+
+        ``guess`` of the value is only used by the alpha-beta search. If
+        ``time_limit`` (in ms) or ``max_nodes`` is given, the alpha-beta
+        search is deepened until the time or the number of the searched
+        positions runs out and ``max_layer_size`` is not used (see
+        ``find_best_move_iterative``).
+        """
+        if self.table is not None:
+            self.table.new_generation()
+        if time_limit or max_nodes:
+            return self.find_best_move_iterative(time_limit, max_layers,
+                    guess, max_nodes)
+        if self.alpha_beta:
+            return self.find_best_move_alpha_beta(max_layers, max_layer_size,
+                    guess)
+        if self.in_place:
+            return self.find_best_move_in_place(max_layers, max_layer_size)
+
+        while len(self.layers) < max_layers:
+            if self.layers and not 0 < len(self.layers[-1]) <= max_layer_size:
                 break
+            self.compute_next_layer()
         self.compute_state_values()
 
         options = sorted((state.value, state) for state in self.layers[0])
         if options:
-            return options[-1][0], options[-1][1].moves[-1].direction
+            return options[-1][0], options[-1][1].move.direction
+        else:
+            return -100, None
+
+    def find_best_move_in_place(self, max_layers, max_layer_size):
+        """Depth-first version of ``find_best_move``.
+
+        Searches to the same depth as the layer-wise version would, but
+        keeps only the current line of moves in memory.
+        """
+        player2pos = dict(self.init_state.player2pos)
+        depth = self.search_depth(player2pos, max_layers, max_layer_size)
+
+        options = []
+        next_player = self.next_player_after(self.my_number)
+        for dir, new_pos in self.moves_of(self.my_number, player2pos):
+            token = self.make_move(self.my_number, new_pos, player2pos)
+            value = self.search(next_player, player2pos, depth - 1)
+            self.unmake_move(self.my_number, token, player2pos)
+            options.append((value, dir))
+
+        if options:
+            return max(options, key=lambda option: option[0])
         else:
             return -100, None
 
+    def find_best_move_alpha_beta(self, max_layers, max_layer_size,
+            guess=None):
+        """Alpha-beta version of ``find_best_move``.
+
+        Finds the same value as the other versions for the same depth. The
+        moves that caused cut-offs on the same ply (killer moves) are tried
+        first, then the moves to the cells with more empty neighbours. If the
+        ``guess`` of the value is given (e.g. the value found on the previous
+        turn), the search starts with the aspiration window around it.
+        """
+        player2pos = dict(self.init_state.player2pos)
+        depth = self.search_depth(player2pos, max_layers, max_layer_size)
+        self.killers = [[] for i in xrange(depth)]
+
+        value, move = self.search_aspiration(player2pos, depth, guess)
+        if move is None:
+            return -100, None
+        return value, move
+
+    def find_best_move_iterative(self, time_limit=None, max_layers=100,
+            guess=None, max_nodes=None):
+        """Deepen the alpha-beta search until ``time_limit`` (in ms) runs out
+        or it has searched ``max_nodes`` positions (one of them must be
+        given).
+
+        Returns the best move of the last completed depth (the first depth is
+        always completed). Every iteration starts with the best move of the
+        previous one and takes its value as the aspiration guess. Stops
+        earlier if no line reaches the full depth.
+        """
+        if not time_limit and not max_nodes:
+            raise ValueError('Time limit or max nodes must be given')
+        deadline = time.time() + time_limit / 1000.0 if time_limit else None
+        node_limit = self.node_count + max_nodes if max_nodes else None
+        player2pos = dict(self.init_state.player2pos)
+        self.killers = [[] for i in xrange(max_layers)]
+        value, move = -100, None
+
+        for depth in xrange(1, max_layers + 1):
+            self.deadline = deadline if depth > 1 else None
+            self.node_limit = node_limit if depth > 1 else None
+            self.leaf_reached = False
+            found_value, found_move = self.search_aspiration(player2pos,
+                    depth, guess, move)
+            if self.timed_out or found_move is None:
+                break
+            value, move = found_value, found_move
+            guess = value
+            self.completed_depth = depth
+            if not self.leaf_reached:
+                break
+
+        self.deadline = None
+        self.node_limit = None
+        self.timed_out = False
+        return value, move
+
+    def search_aspiration(self, player2pos, depth, guess, first_move=None):
+        """Search the root in the window of ``ASPIRATION`` around ``guess``.
+
+        The search is repeated with the full window if the value falls
+        outside. Without ``guess`` the full window is used from the start.
+        """
+        if guess is None:
+            alpha, beta = -INFINITY, INFINITY
+        else:
+            alpha, beta = guess - ASPIRATION, guess + ASPIRATION
+        value, move = self.search_root(player2pos, depth, alpha, beta,
+                first_move)
+        if self.timed_out:
+            return value, move
+        if move is not None and not alpha < value < beta:
+            value, move = self.search_root(player2pos, depth, -INFINITY,
+                    INFINITY, move)
+        return value, move
+
+    def search_root(self, player2pos, depth, alpha, beta, first_move):
+        """Search the moves of the root, ``first_move`` first.
+
+        Returns the best value and move. The value is exact if it's between
+        ``alpha`` and ``beta``, otherwise it's a bound.
+        """
+        next_player = self.next_player_after(self.my_number)
+        best_value, best_move = None, None
+        for _, dir, new_pos in self.ordered_moves(self.my_number,
+                player2pos, 0, first_move):
+            token = self.make_move(self.my_number, new_pos, player2pos)
+            value = self.search_alpha_beta(next_player, player2pos,
+                    depth - 1, alpha, beta, 1)
+            self.unmake_move(self.my_number, token, player2pos)
+            if self.timed_out:
+                break
+            if best_value is None or value > best_value:
+                best_value, best_move = value, dir
+                if value >= beta:
+                    break
+                alpha = max(alpha, value)
+        return best_value, best_move
+
+    def search_alpha_beta(self, player_number, player2pos, depth, alpha, beta,
+            ply):
+        """Alpha-beta version of ``search``.
+
+        Returns the value if it's between ``alpha`` and ``beta``, otherwise
+        a bound of it (fail-soft). After the ``deadline`` or the
+        ``node_limit`` it sets ``timed_out`` and returns a meaningless value
+        right away.
+        """
+        self.node_count += 1
+        if (self.deadline is not None and time.time() > self.deadline or
+                self.node_limit is not None and
+                self.node_count > self.node_limit):
+            self.timed_out = True
+            return 0
+        if depth == 0:
+            self.leaf_reached = True
+            return self.evaluate_cached(self.grid, player2pos, player_number)
+
+        table = self.table
+        table_move = None
+        if table is not None:
+            key = self.grid.position_hash(player_number)
+            entry = table.get(key)
+            if entry is not None:
+                _, entry_depth, value, bound, table_move, _ = entry
+                if entry_depth >= depth and (bound == table.EXACT or
+                        bound == table.LOWER and value >= beta or
+                        bound == table.UPPER and value <= alpha):
+                    # The entry may come from the full depth, don't let the
+                    # iterative deepening think that the lines have ended.
+                    self.leaf_reached = True
+                    return value
+            alpha0, beta0 = alpha, beta
+
+        is_me = player_number == self.my_number
+        moves = self.ordered_moves(player_number, player2pos, ply, table_move)
+        if not moves:
+            return -100 if is_me else 100 / len(self.opponents)
+
+        next_player = self.next_player_after(player_number)
+        best = best_move = None
+        for mover, dir, new_pos in moves:
+            token = self.make_move(mover, new_pos, player2pos)
+            value = self.search_alpha_beta(next_player, player2pos,
+                    depth - 1, alpha, beta, ply + 1)
+            self.unmake_move(mover, token, player2pos)
+            if self.timed_out:
+                return 0
+            if is_me:
+                if best is None or value > best:
+                    best, best_move = value, dir
+                    alpha = max(alpha, value)
+            elif best is None or value < best:
+                best, best_move = value, dir
+                beta = min(beta, value)
+            if alpha >= beta:
+                killers = self.killers[ply]
+                if dir not in killers:
+                    killers.insert(0, dir)
+                    del killers[2:]
+                break
+
+        if table is not None:
+            if best <= alpha0:
+                bound = table.UPPER
+            elif best >= beta0:
+                bound = table.LOWER
+            else:
+                bound = table.EXACT
+            table.put(key, depth, best, bound, best_move)
+        return best
+
+    def ordered_moves(self, player_number, player2pos, ply, first_move=None):
+        """Return the moves of the player in the order of the search."""
+        grid = self.grid
+        killers = self.killers[ply] if ply < len(self.killers) else ()
+
+        def order(move):
+            mover, dir, new_pos = move
+            free = [grid[pos] for pos in grid.neighbours_of(new_pos)].count(0)
+            return dir != first_move, dir not in killers, -free
+
+        return sorted(self.replies_of(player_number, player2pos), key=order)
+
+    def search_depth(self, player2pos, max_layers, max_layer_size):
+        """Return the depth of the search.
+
+        Same depth as the layer-wise ``find_best_move`` reaches: at most
+        ``max_layers``, stopping after the first layer that has more than
+        ``max_layer_size`` states.
+        """
+        depth = 0
+        while depth < max_layers:
+            depth += 1
+            count = self.count_states(self.my_number, player2pos, depth)
+            if count > max_layer_size:
+                break
+        return depth
+
+    def moves_of(self, player_number, player2pos):
+        """Return possible moves of the player as (direction, position)."""
+        cur_pos = player2pos[player_number]
+        return [(dir, cur_pos + offset)
+                for dir, offset in self.grid.DIRECTIONS.items()
+                if self.grid[cur_pos + offset] == 0]
+
+    def movers_on_ply(self, player_number):
+        """Return the players that move on the ply of the player.
+
+        In the best-reply search that's all opponents on the ply of any
+        opponent.
+        """
+        if self.best_reply and player_number != self.my_number:
+            return sorted(self.opponents)
+        return [player_number]
+
+    def replies_of(self, player_number, player2pos):
+        """Return possible moves on the ply of the player as (player,
+        direction, position)."""
+        return [(mover, dir, new_pos)
+                for mover in self.movers_on_ply(player_number)
+                for dir, new_pos in self.moves_of(mover, player2pos)]
+
+    def make_move(self, player_number, new_pos, player2pos):
+        """Make the move on the grid, return the token for undoing it."""
+        player2pos[player_number] = new_pos
+        return self.grid.apply_move(player_number, new_pos)
+
+    def unmake_move(self, player_number, token, player2pos):
+        """Undo the move made by ``make_move``."""
+        self.grid.undo(token)
+        player2pos[player_number] = token[0]
+
+    def count_states(self, player_number, player2pos, depth):
+        """Count the states ``depth`` moves below the current one."""
+        if depth == 0:
+            return 1
+        count = 0
+        next_player = self.next_player_after(player_number)
+        for mover, dir, new_pos in self.replies_of(player_number, player2pos):
+            token = self.make_move(mover, new_pos, player2pos)
+            count += self.count_states(next_player, player2pos, depth - 1)
+            self.unmake_move(mover, token, player2pos)
+        return count
+
+    def search(self, player_number, player2pos, depth):
+        """Return the value of the position with ``player_number`` to move.
+
+        Gives the same values as ``compute_state_values`` does.
+        """
+        self.node_count += 1
+        if depth == 0:
+            return self.evaluate_cached(self.grid, player2pos, player_number)
+
+        next_player = self.next_player_after(player_number)
+        values = []
+        for mover, dir, new_pos in self.replies_of(player_number, player2pos):
+            token = self.make_move(mover, new_pos, player2pos)
+            values.append(self.search(next_player, player2pos, depth - 1))
+            self.unmake_move(mover, token, player2pos)
+
+        is_me = player_number == self.my_number
+        if values:
+            return max(values) if is_me else min(values)
+        elif is_me:
+            return -100  # dead end
+        else:
+            return 100 / len(self.opponents)  # kill
+
     def unlink_states(self):
         """Unlink the tree of states so it can be GC'd."""
         for layer in self.layers:
@@ -101,9 +570,12 @@ class MiniMax(object):
 
     def create_init_state(self):
         """Create initial state."""
-        player2pos = dict(self.opponents)
-        player2pos[self.my_number] = self.my_pos
-        self.init_state = State([], self.grid, player2pos, self.my_number)
+        positions = [None] * 4
+        for number, pos in self.opponents.items():
+            positions[number] = pos
+        positions[self.my_number] = self.my_pos
+        self.init_state = State(None, tuple(positions), self.my_number,
+                root_grid=self.grid)
 
     def compute_next_layer(self):
         """Compute next layer of the moves."""
@@ -118,7 +590,15 @@ class MiniMax(object):
         self.layers.append(new_layer)
 
     def next_player_after(self, player_number):
-        """Return next player in the moving order."""
+        """Return next player in the moving order.
+
+        In the best-reply search the plies of the opponents are given to
+        the first of them (see ``replies_of``).
+        """
+        if self.best_reply and self.opponents:
+            if player_number == self.my_number:
+                return min(self.opponents)
+            return self.my_number
         np = (player_number + 1) % 4
         while np != self.my_number and np not in self.opponents:
             np = (np + 1) % 4
@@ -126,36 +606,87 @@ class MiniMax(object):
 
     def compute_layer(self, prev_layer, player_number):
         """Compute and yield the next layer of decision tree."""
+        next_player = self.next_player_after(player_number)
+        is_mine = player_number == self.my_number
+        movers = self.movers_on_ply(player_number)
         for state in prev_layer:
-            cur_pos = state.player2pos[player_number]
-            for dir, offset in self.grid.DIRECTIONS.items():
-                new_pos = cur_pos + offset
-                if state.grid[new_pos] == 0:
-                    grid = state.grid.copy()
-                    grid[new_pos] = grid.head_of(player_number)
-                    grid[cur_pos] = grid.body_of(player_number)
-                    move = Move(player_number,
-                            player_number == self.my_number, dir)
-                    moves = state.moves + [move]
-                    player2pos = dict(state.player2pos)
-                    player2pos[player_number] = new_pos
-                    new_state = State(moves, grid, player2pos,
-                            self.next_player_after(player_number), state)
-                    state.add_next_state(new_state)
-                    yield new_state
-
-    def evaluate_state(self, state):
-        """Evaluate the value of the state for us."""
-
-        def player_probe(player_number):
-            return state.grid.bfs_probe(state.player2pos[player_number],
-                    limit=40).empty_count
-
-        my_volume = player_probe(self.my_number)
-        other_volumes = [player_probe(number) for number in self.opponents]
-
-        max_volume = max([my_volume] + other_volumes)
-        state.value = (my_volume - max(other_volumes)) * 80.0 / max_volume
+            grid = state.grid
+            for mover in movers:
+                cur_pos = state.positions[mover]
+                for dir, offset in self.grid.DIRECTIONS.items():
+                    new_pos = cur_pos + offset
+                    if grid[new_pos] == 0:
+                        move = Move(mover, is_mine, dir)
+                        yield state.next_state(move, new_pos, next_player)
+
+    def evaluate_state(self, state, grid=None):
+        """Evaluate the value of the state for us (``grid`` is the grid of
+        the state if it's already made)."""
+        if grid is None:
+            grid = state.grid
+        state.value = self.evaluate_cached(grid, state.player2pos,
+                state.next_player)
+
+    def evaluate_layer(self, layer):
+        """Evaluate the states of the layer.
+
+        The grid is made once for the states that come from the same state:
+        the moves are made on the grid of that state and taken back.
+        """
+        for prev_state, states in groupby(layer, attrgetter('prev_state')):
+            grid = prev_state.grid
+            if prev_state.root_grid is not None:
+                grid = grid.copy()
+            for state in states:
+                number = state.move.player_number
+                token = grid.apply_move(number, state.positions[number])
+                self.evaluate_state(state, grid)
+                grid.undo(token)
+
+    def evaluate_cached(self, grid, player2pos, player_to_move):
+        """Evaluate the position, look it up in the table first.
+
+        An exact value from a deeper search beats the evaluation, so any
+        exact entry will do.
+        """
+        if self.table is None:
+            return self.evaluate(grid, player2pos)
+        key = grid.position_hash(player_to_move)
+        entry = self.table.get(key)
+        if entry is not None and entry[3] == self.table.EXACT:
+            return entry[2]
+        value = self.evaluate(grid, player2pos)
+        self.table.put(key, 0, value, self.table.EXACT)
+        return value
+
+    def score(self, volumes):
+        """Score the position by the volumes (by player number)."""
+        my_volume = volumes[self.my_number]
+        other_volumes = [volumes[number] for number in self.opponents]
+
+        max_volume = max([my_volume] + other_volumes) or 1
+        return (my_volume - max(other_volumes)) * 80.0 / max_volume
+
+    def evaluate_volume(self, grid, player2pos):
+        """Evaluate the value of the position by the space around players."""
+        return self.score({number: grid.bfs_probe(pos, limit=40,
+            lean=True).empty_count for number, pos in player2pos.items()})
+
+    def evaluate_fillable(self, grid, player2pos):
+        """Evaluate the value of the position by the fillable space.
+
+        Same as ``evaluate_volume`` but uses the parity-corrected bound of
+        the moves (see ``ProbeResult.fillable``).
+        """
+        return self.score({number: grid.bfs_probe(pos, limit=40,
+            lean=True).fillable for number, pos in player2pos.items()})
+
+    def evaluate_voronoi(self, grid, player2pos):
+        """Evaluate the value of the position by the territory of players.
+
+        The cells that we can reach before anyone else are ours.
+        """
+        return self.score(grid.voronoi(player2pos, limit=40).counts)
 
     def aggredate_state(self, state):
         """Aggregate the value from the states below this."""
@@ -175,8 +706,8 @@ class MiniMax(object):
     def compute_state_values(self):
         """Compute the values of all states we've calculated."""
         for i, layer in enumerate(reversed(self.layers)):
-            for state in layer:
-                if i == 0:
-                    self.evaluate_state(state)
-                else:
+            if i == 0:
+                self.evaluate_layer(layer)
+            else:
+                for state in layer:
                     self.aggredate_state(state)
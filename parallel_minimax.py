@@ -0,0 +1,88 @@
+"""
+Parallel MiniMax -- the moves of the root searched by a pool of processes.
+
+This is for the analysis and the tuning on multi-core machines, the bots run
+on one core and use ``MiniMax`` directly.
+"""
+
+from grid import TronGrid  # @include(grid.py)
+from minimax import INFINITY, MiniMax  # @include(minimax.py)
+from player import PlayerInfo  # @include(player.py)
+
+
+def search_root_move(task):
+    """Return the value of the root move and the number of the searched
+    positions (runs in the worker process).
+
+    ``task`` is ``(packed grid, width, height, player number, head x, head
+    y, direction, depth, evaluation, alpha_beta)``. The value is found with
+    the full window, so it's exact for every move.
+    """
+    (data, width, height, number, x, y, direction, depth, evaluation,
+            alpha_beta) = task
+    grid = TronGrid.unpack(data, width=width, height=height)
+    player = PlayerInfo(number)
+    player.move(x, y, x, y)
+    mm = MiniMax(grid, player, evaluation=evaluation, alpha_beta=alpha_beta)
+    player2pos = dict(mm.init_state.player2pos)
+    mm.make_move(number, mm.my_pos + grid.DIRECTIONS[direction], player2pos)
+    next_player = mm.next_player_after(number)
+    if alpha_beta:
+        mm.killers = [[] for i in xrange(depth)]
+        value = mm.search_alpha_beta(next_player, player2pos, depth - 1,
+                -INFINITY, INFINITY, 1)
+    else:
+        value = mm.search(next_player, player2pos, depth - 1)
+    return value, mm.node_count
+
+
+class ParallelMiniMax(MiniMax):
+    """MiniMax that searches the moves of the root in ``pool``.
+
+    The grid is sent to the workers packed (see ``TronGrid.pack``) and every
+    worker searches the subtree of one move depth-first, like
+    ``find_best_move_in_place`` or, with ``alpha_beta``, like
+    ``find_best_move_alpha_beta`` (but without the window from the other
+    moves). The values are the same as the ones of the one-process search,
+    so is the move unless several moves have the best value. Only as many
+    processes as there are moves of the root (at most 4) are busy.
+    """
+
+    def __init__(self, grid, player, pool, full_bfs=None,
+            evaluation='volume', alpha_beta=False):
+        """Initialize the algorithm.
+
+        :param multiprocessing.Pool pool: Pool of the workers.
+
+        The rest of the parameters are as for ``MiniMax``.
+        """
+        super(ParallelMiniMax, self).__init__(grid, player, full_bfs,
+                evaluation=evaluation, alpha_beta=alpha_beta)
+        self.pool = pool
+        self.evaluation = evaluation
+
+    def find_best_move(self, max_layers=5, max_layer_size=60, guess=None,
+            time_limit=None, max_nodes=None):
+        """Find the best move searching to the depth that the layer-wise
+        ``MiniMax.find_best_move`` would reach (``guess``, ``time_limit``
+        and ``max_nodes`` are not used)."""
+        player2pos = dict(self.init_state.player2pos)
+        depth = self.search_depth(player2pos, max_layers, max_layer_size)
+        data = self.grid.pack()
+        x, y = self.grid.index2coords(self.my_pos)
+        moves = [dir for dir, new_pos in
+                self.moves_of(self.my_number, player2pos)]
+        tasks = [(data, self.grid.width, self.grid.height, self.my_number,
+                x, y, dir, depth, self.evaluation, self.alpha_beta)
+                for dir in moves]
+
+        options = []
+        for dir, (value, node_count) in zip(moves,
+                self.pool.map(search_root_move, tasks)):
+            self.node_count += node_count
+            options.append((value, dir))
+
+        if options:
+            return max(options, key=lambda option: option[0])
+        else:
+            return -100, None
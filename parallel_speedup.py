@@ -0,0 +1,73 @@
+"""
+parallel_speedup.py -- measure the speedup of the parallel MiniMax.
+
+usage:
+    parallel_speedup.py [-m LAYERS] [-a] [-e EVALUATION] [-c CORES]
+
+Searches the position of the MiniMax benchmarks with the one-process
+depth-first search and with ``ParallelMiniMax`` on the pools of 1 to CORES
+processes and prints the times and the speedups.
+"""
+
+import argparse
+import multiprocessing
+import time
+
+from grid import TronGrid
+from minimax import MiniMax
+from parallel_minimax import ParallelMiniMax
+from player import PlayerInfo
+
+
+def benchmark_position():
+    """Grid and player of the MiniMax benchmarks in ``tests/perf_test.py``."""
+    grid = TronGrid()
+    grid.put(2, 15, grid.head_of(1))
+    grid.put(0, 5, grid.head_of(2))
+    grid.vline(3, 0, 15, grid.body_of(1))
+    player = PlayerInfo(1)
+    player.move(2, 15, 2, 15)
+    return grid, player
+
+
+def timed_search(mm, max_layers):
+    """Return the result of the search, the time it took and the number of
+    the searched positions."""
+    start = time.time()
+    result = mm.find_best_move(max_layers=max_layers, max_layer_size=10 ** 6)
+    return result, time.time() - start, mm.node_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parallel MiniMax speedup.')
+    parser.add_argument('--max-layers', '-m', type=int, default=6,
+            metavar='LAYERS', help='Depth of the search.')
+    parser.add_argument('--alpha-beta', '-a', action='store_true',
+            help='Use the alpha-beta search.')
+    parser.add_argument('--evaluation', '-e', type=str, default='volume',
+            help='Evaluation of the positions.')
+    parser.add_argument('--cores', '-c', type=int,
+            default=multiprocessing.cpu_count(),
+            help='Largest pool to try.')
+    config = parser.parse_args()
+
+    grid, player = benchmark_position()
+    mm = MiniMax(grid, player, in_place=not config.alpha_beta,
+            alpha_beta=config.alpha_beta, evaluation=config.evaluation)
+    result, base, nodes = timed_search(mm, config.max_layers)
+    print 'one process: {:.3f} s, {} positions, {}'.format(base, nodes,
+            result)
+
+    for cores in xrange(1, config.cores + 1):
+        pool = multiprocessing.Pool(cores)
+        pmm = ParallelMiniMax(grid, player, pool,
+                alpha_beta=config.alpha_beta, evaluation=config.evaluation)
+        result, secs, nodes = timed_search(pmm, config.max_layers)
+        pool.close()
+        pool.join()
+        print '{} cores: {:.3f} s, speedup {:.2f}, {} positions, {}'.format(
+                cores, secs, base / secs, nodes, result)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,16 +3,21 @@ Tron Battle server.
 """
 
 import os
+import base64
 import random
 import time
 import datetime
 import threading
 from subprocess import Popen, PIPE
 
-from grid import TronGrid
+from grid import HEIGHT, WIDTH, TronGrid
 from player import PlayerInfo
 
 
+#: Names of the moves by the change of the coordinates.
+MOVES = {(0, -1): 'UP', (0, 1): 'DOWN', (-1, 0): 'LEFT', (1, 0): 'RIGHT'}
+
+
 class StreamReader(threading.Thread):
     """Thread that reads a stream."""
 
@@ -34,9 +39,14 @@ class StreamReader(threading.Thread):
 
 
 class PlayerProgram(PlayerInfo):
-    """Controller of a player program."""
+    """Controller of a player program.
+
+    The size of the board is passed to the program in the ``TRON_BOARD``
+    environment variable as ``<width>x<height>``.
+    """
 
-    def __init__(self, number, title, command, server_log):
+    def __init__(self, number, title, command, server_log,
+            board=(WIDTH, HEIGHT)):
         PlayerInfo.__init__(self, number)
         self.steps = 0
         self.total_step_time = 0
@@ -45,8 +55,9 @@ class PlayerProgram(PlayerInfo):
         self.msg = ''
         self.server_log = server_log
         self.points = []
+        env = dict(os.environ, TRON_BOARD='{}x{}'.format(*board))
         self.process = Popen(command, shell=True, stdin=PIPE, stdout=PIPE,
-                stderr=PIPE)
+                stderr=PIPE, env=env)
         self.stderr_reader = StreamReader(self.process.stderr)
         self.stderr_reader.start()
 
@@ -70,10 +81,7 @@ class PlayerProgram(PlayerInfo):
         except IndexError:
             return None
 
-        last, prev = map(lambda pt: TronGrid.coords2index(*pt), [last, prev])
-        offset = last - prev
-        r_dir = {off: dir for dir, off in TronGrid.DIRECTIONS.items()}
-        return r_dir.get(offset, None)
+        return MOVES.get((last[0] - prev[0], last[1] - prev[1]))
 
     @property
     def avg_step_time(self):
@@ -144,7 +152,9 @@ class PlayerProgram(PlayerInfo):
 
 class TronServer(object):
 
-    def __init__(self):
+    def __init__(self, width=WIDTH, height=HEIGHT):
+        self.width = width
+        self.height = height
         self.players = {}
         self.open_log_file()
         self.reset()
@@ -162,7 +172,8 @@ class TronServer(object):
         if self.players:
             for player in self.alive_players:
                 player.die('Game finished.')
-        self.grid = TronGrid()
+        self.grid = TronGrid(indexed=True, width=self.width,
+                height=self.height)
         self.player_count = 0
         self.turn_count = 0
         self.players = {}
@@ -179,8 +190,8 @@ class TronServer(object):
     def find_empty_spot(self):
         """Find an empty point in the field."""
         while 1:
-            x = random.randrange(30)
-            y = random.randrange(20)
+            x = random.randrange(self.width)
+            y = random.randrange(self.height)
             if self.grid.get(x, y) == 0:
                 return x, y
 
@@ -190,17 +201,19 @@ class TronServer(object):
         self.player_count += 1
 
         player = self.players[index] = \
-                PlayerProgram(index, title, command, self.log)
+                PlayerProgram(index, title, command, self.log,
+                        (self.width, self.height))
         self.log('Added player {} as {} ({})'.format(title, index, command))
 
         x, y = self.find_empty_spot()
         player.move(x, y, x, y)
 
     def dump_grid(self):
-        """Dump the playing field to the log file."""
-        self.log('Dumping the grid')
-        for line in str(self.grid).split('\n'):
-            self.log(line)
+        """Dump the playing field to the log file.
+
+        The grid is packed (see ``TronGrid.pack``) and base64-encoded.
+        """
+        self.log('Grid: ' + base64.b64encode(self.grid.pack()))
 
     def kill_player(self, player, msg):
         """Declare the player dead and remove from the field."""
@@ -0,0 +1,119 @@
+"""
+Shared grid -- the field of the Tron Battle in shared memory.
+"""
+
+import ctypes
+import mmap
+from array import array
+
+from grid import HEIGHT, WIDTH, TronGrid  # @include(grid.py)
+
+
+class SharedTronGrid(TronGrid):
+    """Tron grid with the cells in a shared memory map.
+
+    The cells are a ctypes array on top of an ``mmap``. The processes forked
+    after the grid is made share its anonymous map and, if the grid is made
+    with ``path``, other processes can ``attach`` to the file of the map
+    (pickling the grid does that too). Either way the cells are not copied.
+
+    The owner of the grid makes the moves, the workers get read-only views
+    of the current position and make private copies (plain ``TronGrid``s)
+    if they need to change it. So only the moves have to be sent to the
+    workers. There's no locking: the owner shouldn't move while the workers
+    look at the grid. The trackers of the owner are not seen by the views.
+    """
+
+    def __init__(self, indexed=False, hashed=False, run_lengths=False,
+            width=WIDTH, height=HEIGHT, path=None):
+        super(SharedTronGrid, self).__init__(indexed, hashed, run_lengths,
+                width, height)
+        size = len(self.grid.tostring())
+        if path is None:
+            shared_map = mmap.mmap(-1, size)
+        else:
+            with open(path, 'w+b') as fp:
+                fp.write('\0' * size)
+                fp.flush()
+                shared_map = mmap.mmap(fp.fileno(), size)
+        shared_map[:] = self.grid.tostring()
+        self.attach_map(shared_map, path)
+        self.readonly = False
+
+    def attach_map(self, shared_map, path):
+        """Use the cells in ``shared_map``."""
+        self.map = shared_map
+        self.path = path
+        cells_type = ctypes.c_short * (len(shared_map) // 2)
+        self.grid = cells_type.from_buffer(shared_map)
+
+    @classmethod
+    def view_of(cls, shared_map, path=None, width=WIDTH, height=HEIGHT):
+        """Return a read-only view of the grid in ``shared_map``."""
+        view = cls.__new__(cls)
+        TronGrid.__init__(view, width=width, height=height)
+        view.attach_map(shared_map, path)
+        view.readonly = True
+        return view
+
+    def view(self):
+        """Return a read-only view of the grid (e.g. for forked workers)."""
+        return self.view_of(self.map, self.path, self.width, self.height)
+
+    def __reduce__(self):
+        if self.path is None:
+            raise TypeError('Anonymous shared grid can only be passed to '
+                    'forked processes')
+        return attach, (self.path, self.width, self.height)
+
+    def check_writable(self):
+        """Raise TypeError if this is a read-only view."""
+        if self.readonly:
+            raise TypeError('View of the shared grid is read-only')
+
+    def __setitem__(self, idx, value):
+        self.check_writable()
+        super(SharedTronGrid, self).__setitem__(idx, value)
+
+    def replace(self, src, dst):
+        self.check_writable()
+        super(SharedTronGrid, self).replace(src, dst)
+
+    def bfs_fill(self, value, origins):
+        self.check_writable()
+        super(SharedTronGrid, self).bfs_fill(value, origins)
+
+    def cells(self):
+        """Return a private copy of the cells as ``array('h')``."""
+        return array('h', str(buffer(self.grid)))
+
+    def copy(self):
+        """Return a private ``TronGrid`` with the same cells.
+
+        The copy keeps the same built-in trackers as this grid (see
+        ``TronGrid``), the ones added with ``add_tracker`` are not copied.
+        """
+        tg = TronGrid(self.cell_index is not None, self.zobrist is not None,
+                self.run_lengths is not None, self.width, self.height)
+        tg.grid = self.cells()
+        for tracker in tg.trackers:
+            tracker.reset(tg)
+        return tg
+
+    def count_of(self, value):
+        if value > 0 and self.cell_index is not None:
+            return super(SharedTronGrid, self).count_of(value)
+        return self.cells().count(value)
+
+    def pack(self):
+        tg = TronGrid(width=self.width, height=self.height)
+        tg.grid = self.cells()
+        return tg.pack()
+
+
+def attach(path, width=WIDTH, height=HEIGHT):
+    """Return a read-only view of the grid of the given size shared in
+    ``path``."""
+    with open(path, 'r+b') as fp:
+        shared_map = mmap.mmap(fp.fileno(), 0)
+    return SharedTronGrid.view_of(shared_map, path, width, height)
@@ -4,16 +4,30 @@ import time
 import sys
 import os
 import functools
+import pickle
+import random
+import tempfile
+
+import mock
 
 dn = os.path.dirname
 ap = os.path.abspath
 sys.path.append(dn(dn(ap(__file__))))
 sys.path.append(dn(ap(__file__)))
 
+from test_corridor import tg_snake
 from test_grid import tg, tg_box1
 from test_minimax import tg as mm_tg, player as mm_player
 
+from bitboard import BitTronGrid
+from corridor import Degrees, corridor_graph
+from distance_field import DistanceField
+from grid import TronGrid
+from mcts import MCTS
 from minimax import MiniMax
+from parallel_minimax import search_root_move
+from player import PlayerInfo
+from shared_grid import SharedTronGrid
 
 
 TEMPLATE = '{name}\n\tx {count} = {msecs:.3f} ms, average = {once:.3f} {unit}'
@@ -96,6 +110,26 @@ def replace1_100():
     return t
 
 
+@timed(30, 100)
+def replace600_100_indexed():
+    """Replace a value that has 600 positions in the indexed grid."""
+    t = TronGrid(indexed=True)
+    t.replace(0, 1)
+    for i in xrange(1, 101):
+        t.replace(i, i + 1)
+    return t
+
+
+@timed(30, 100)
+def replace1_100_indexed():
+    """Replace a value that has 1 position in the indexed grid."""
+    t = TronGrid(indexed=True)
+    t[655] = 1
+    for i in xrange(1, 101):
+        t.replace(i, i + 1)
+    return t
+
+
 @timed(50, 100)
 def copy_100():
     """Copy the whole grid."""
@@ -105,6 +139,56 @@ def copy_100():
     return t1
 
 
+box = tg_box1(tg())
+packed_box = box.pack()
+
+
+@timed(50, 100)
+def str_100():
+    """Convert the grid to a string."""
+    for i in xrange(100):
+        str(box)
+
+
+@timed(50, 100)
+def pack_100():
+    """Pack the grid."""
+    for i in xrange(100):
+        box.pack()
+
+
+@timed(50, 100)
+def unpack_100():
+    """Unpack the grid."""
+    for i in xrange(100):
+        TronGrid.unpack(packed_box)
+
+
+@timed(50, 100)
+def pickle_100():
+    """Pickle and unpickle the grid."""
+    for i in xrange(100):
+        pickle.loads(pickle.dumps(box, 2))
+
+
+def pickle_shared_100():
+    """Time pickling of the shared grid in a temporary file."""
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        shared_box = tg_box1(SharedTronGrid(path=path))
+
+        @timed(50, 100)
+        def pickle_shared_100():
+            """Pickle and unpickle (attach to) the shared grid."""
+            for i in xrange(100):
+                pickle.loads(pickle.dumps(shared_box, 2))
+
+        pickle_shared_100()
+    finally:
+        os.remove(path)
+
+
 @timed(1000)
 def bfs_probe_empty():
     """BFS probe in the empty grid from the center."""
@@ -126,6 +210,59 @@ def bfs_probe_limit10():
     t.bfs_probe(t.coords2index(15, 10), limit=10)
 
 
+@timed(1000)
+def chambers_box():
+    """Chamber decomposition from the box in the center."""
+    t = tg_box1(tg())
+    t.chambers(t.coords2index(15, 10))
+
+
+@timed(1000)
+def bfs_probe_lean():
+    """Lean BFS probe in the empty grid from the center."""
+    t = tg()
+    t.bfs_probe(t.coords2index(15, 10), lean=True)
+
+
+@timed(500)
+def bfs_probe_4():
+    """Four BFS probes around the center."""
+    t = tg()
+    c = t.coords2index(15, 10)
+    for pos in [c - 64, c - 1, c + 1, c + 64]:
+        t.bfs_probe(pos, limit=20)
+
+
+@timed(500)
+def bfs_probe_many_4():
+    """Batched BFS probe of four positions around the center."""
+    t = tg()
+    c = t.coords2index(15, 10)
+    t.bfs_probe_many([c - 64, c - 1, c + 1, c + 64], limit=20)
+
+
+bit_empty = BitTronGrid()
+bit_box = tg_box1(BitTronGrid())
+
+
+@timed(1000)
+def bit_bfs_probe_empty():
+    """Bitboard BFS probe in the empty grid from the center."""
+    bit_empty.bfs_probe(bit_empty.coords2index(15, 10))
+
+
+@timed(1000)
+def bit_bfs_probe_box():
+    """Bitboard BFS probe from the box in the center."""
+    bit_box.bfs_probe(bit_box.coords2index(15, 10))
+
+
+@timed(1000)
+def bit_bfs_probe_limit10():
+    """Bitboard BFS probe with the limit of 10."""
+    bit_empty.bfs_probe(bit_empty.coords2index(15, 10), limit=10)
+
+
 @timed(50, 100)
 def ray_probe_empty0_100():
     """Ray probe from the center, width = 0."""
@@ -158,6 +295,71 @@ def ray_probe_l5_100():
         t.ray_probe(t.coords2index(15, 10), t.DIRECTIONS['RIGHT'], 10, limit=5)
 
 
+@timed(50, 100)
+def ray_probe_all6_100():
+    """Ray probes in all directions from the center, width = 6."""
+    t = tg()
+    for i in xrange(100):
+        t.ray_probe_all(t.coords2index(15, 10), 6)
+
+
+run_grid = tg_box1(TronGrid(run_lengths=True))
+
+
+@timed(50, 100)
+def free_run_all_100():
+    """Free runs in all directions from the center."""
+    pos = run_grid.coords2index(15, 10)
+    for i in xrange(100):
+        for offset in run_grid.DIRECTIONS.values():
+            run_grid.free_run(pos, offset)
+
+
+@timed(50, 100)
+def free_run_set_100():
+    """Fill and free a cell keeping the run lengths."""
+    pos = run_grid.coords2index(15, 10)
+    for i in xrange(100):
+        run_grid[pos] = 1
+        run_grid[pos] = 0
+
+
+field_grid = tg_box1(TronGrid())
+field = field_grid.add_tracker(DistanceField(field_grid.coords2index(15, 10)))
+
+
+@timed(50, 100)
+def distance_field_100():
+    """Fill and free a cell keeping the distance field."""
+    pos = field_grid.coords2index(18, 8)
+    for i in xrange(100):
+        field_grid[pos] = 1
+        field_grid[pos] = 0
+
+
+snake = tg_snake(TronGrid())
+snake.add_tracker(Degrees())
+snake_graph = corridor_graph(snake)
+
+
+@timed(1000)
+def bfs_probe_snake():
+    """Lean BFS probe along the winding corridor."""
+    snake.bfs_probe(0, lean=True)
+
+
+@timed(1000)
+def corridor_graph_snake():
+    """Build the corridor graph of the winding corridor."""
+    corridor_graph(snake)
+
+
+@timed(1000)
+def corridor_empty_count_snake():
+    """Count the empty cells along the winding corridor on the graph."""
+    snake_graph.empty_count(0)
+
+
 @timed(30)
 def mm_find_best():
     """MiniMax find best move (max_layers=3)."""
@@ -168,17 +370,225 @@ def mm_find_best():
     mm.find_best_move(max_layers=3)
 
 
+@timed(30)
+def mm_find_best_in_place():
+    """MiniMax find best move in place (max_layers=3)."""
+    t = mm_tg()
+    t.vline(3, 0, 15, t.body_of(1))
+
+    mm = MiniMax(t, mm_player(), in_place=True)
+    mm.find_best_move(max_layers=3)
+
+
+@timed(30)
+def mm_find_best_voronoi():
+    """MiniMax find best move with voronoi evaluation (max_layers=3)."""
+    t = mm_tg()
+    t.vline(3, 0, 15, t.body_of(1))
+
+    mm = MiniMax(t, mm_player(), evaluation='voronoi')
+    mm.find_best_move(max_layers=3)
+
+
+@timed(5)
+def mm_find_best_in_place_6():
+    """MiniMax find best move in place (max_layers=6)."""
+    t = mm_tg()
+    t.vline(3, 0, 15, t.body_of(1))
+
+    mm = MiniMax(t, mm_player(), in_place=True)
+    mm.find_best_move(max_layers=6, max_layer_size=10000)
+
+
+@timed(5)
+def mm_find_best_alpha_beta_6():
+    """MiniMax find best move with alpha-beta (max_layers=6)."""
+    t = mm_tg()
+    t.vline(3, 0, 15, t.body_of(1))
+
+    mm = MiniMax(t, mm_player(), alpha_beta=True)
+    mm.find_best_move(max_layers=6, max_layer_size=10000)
+
+
+@timed(5)
+def mm_find_best_alpha_beta_8():
+    """MiniMax find best move with alpha-beta (max_layers=8)."""
+    t = mm_tg()
+    t.vline(3, 0, 15, t.body_of(1))
+
+    mm = MiniMax(t, mm_player(), alpha_beta=True)
+    mm.find_best_move(max_layers=8, max_layer_size=10000)
+
+
+@timed(1, 1000)
+def mcts_random_1000():
+    """MCTS playout with the random policy."""
+    t = mm_tg()
+    t.vline(3, 0, 15, t.body_of(1))
+
+    mcts = MCTS(t, mm_player(), playout='random', seed=1)
+    mcts.find_best_move(playouts=1000)
+
+
+@timed(1, 1000)
+def mcts_hug_1000():
+    """MCTS playout with the wall-hugging policy."""
+    t = mm_tg()
+    t.vline(3, 0, 15, t.body_of(1))
+
+    mcts = MCTS(t, mm_player(), playout='hug', seed=1)
+    mcts.find_best_move(playouts=1000)
+
+
+def pocket_positions(count, seed=0):
+    """Yield random positions with all 4 players in one pocket as (grid,
+    player 0)."""
+    rnd = random.Random(seed)
+    found = 0
+    while found < count:
+        t = TronGrid()
+        for i in xrange(4):
+            pos = t.coords2index(rnd.randrange(30), rnd.randrange(20))
+            while t[pos] != 0:
+                pos = t.coords2index(rnd.randrange(30), rnd.randrange(20))
+            for j in xrange(10):
+                t[pos] = t.body_of(i)
+                options = [pos + offset for offset in t.DIRECTIONS.values()
+                        if t[pos + offset] == 0]
+                if not options:
+                    break
+                pos = rnd.choice(options)
+            t[pos] = t.head_of(i)
+            if i == 0:
+                player = PlayerInfo(0)
+                player.move(*(t.index2coords(pos) * 2))
+        mm = MiniMax(t, player)
+        if len(mm.opponents) == 3 and mm.moves_of(0, mm.init_state.player2pos):
+            found += 1
+            yield t, player
+
+
+def best_reply_quality(count=20, rounds=(1, 2, 3)):
+    """Compare the best-reply search with the full alpha-beta search.
+
+    For every position the moves of the root are valued by the full search
+    of 2 rounds (8 plies). The searches are compared by the number of the
+    positions they visit, time and the loss of the value of the move they
+    choose against the best move.
+    """
+    searches = [('full, 4 plies', 4, False), ('full, 8 plies', 8, False)]
+    searches += [('best reply, {} plies'.format(2 * r), 2 * r, True)
+            for r in rounds]
+    totals = {name: [0, 0.0, 0.0, 0] for name, _, _ in searches}
+    for t, player in pocket_positions(count):
+        data = t.pack()
+        values = {}
+        mm = MiniMax(t, player)
+        for dir, new_pos in mm.moves_of(0, mm.init_state.player2pos):
+            values[dir] = search_root_move((data, 30, 20, 0, player.x1,
+                    player.y1, dir, 8, 'volume', True))[0]
+        for name, depth, best_reply in searches:
+            mm = MiniMax(t, player, alpha_beta=True, best_reply=best_reply)
+            start = time.time()
+            weight, move = mm.find_best_move(max_layers=depth,
+                    max_layer_size=10 ** 6)
+            total = totals[name]
+            total[0] += mm.node_count
+            total[1] += time.time() - start
+            total[2] += max(values.values()) - values[move]
+            total[3] += values[move] == max(values.values())
+    print 'Best-reply search, {} positions with 4 players:'.format(count)
+    for name, _, _ in searches:
+        nodes, secs, loss, best = totals[name]
+        print ('\t{:<22} {:7.0f} positions, {:7.1f} ms, value loss {:.3f}, '
+                'best move {:.0f}%'.format(name, float(nodes) / count,
+                secs * 1000 / count, loss / count, 100.0 * best / count))
+
+
+def scaling(width, height):
+    """Return the benchmarks of the probes and MiniMax on a bigger board.
+
+    The position is the one of the MiniMax benchmarks stretched to the
+    board.
+    """
+    size = '{} x {}'.format(width, height)
+    t = TronGrid(width=width, height=height)
+    bt = BitTronGrid(width=width, height=height)
+    for g in t, bt:
+        g.vline(3, 0, height * 3 // 4, g.body_of(1))
+        g.put(2, height * 3 // 4, g.head_of(1))
+        g.put(0, height // 4, g.head_of(2))
+    center = t.coords2index(width // 2, height // 2)
+    player = mock.Mock(x1=2, y1=height * 3 // 4, number=1)
+
+    def bfs_probe():
+        t.bfs_probe(center)
+
+    def bit_bfs_probe():
+        bt.bfs_probe(center)
+
+    def ray_probe_all():
+        for i in xrange(10):
+            t.ray_probe_all(center, 6)
+
+    def mm_find_best():
+        mm = MiniMax(t.copy(), player)
+        mm.find_best_move(max_layers=3)
+
+    bfs_probe.__doc__ = 'BFS probe from the center, {}.'.format(size)
+    bit_bfs_probe.__doc__ = ('Bitboard BFS probe from the center, {}.'
+            .format(size))
+    ray_probe_all.__doc__ = ('Ray probes in all directions from the center, '
+            'width = 6, {}.'.format(size))
+    mm_find_best.__doc__ = ('MiniMax find best move (max_layers=3), {}.'
+            .format(size))
+    return [timed(100)(bfs_probe), timed(100)(bit_bfs_probe),
+            timed(100, 10)(ray_probe_all), timed(5)(mm_find_best)]
+
+
 if __name__ == '__main__':
     copy_100()
+    str_100()
+    pack_100()
+    unpack_100()
+    pickle_100()
+    pickle_shared_100()
     replace1_100()
     replace600_100()
+    replace1_100_indexed()
+    replace600_100_indexed()
     bfs_fill1()
     bfs_fill3()
     bfs_probe_empty()
     bfs_probe_box()
     bfs_probe_limit10()
+    bfs_probe_lean()
+    chambers_box()
+    bfs_probe_4()
+    bfs_probe_many_4()
+    bit_bfs_probe_empty()
+    bit_bfs_probe_box()
+    bit_bfs_probe_limit10()
     ray_probe_empty0_100()
     ray_probe_empty5_100()
     ray_probe_box10_100()
     ray_probe_l5_100()
+    ray_probe_all6_100()
+    free_run_all_100()
+    free_run_set_100()
+    distance_field_100()
+    bfs_probe_snake()
+    corridor_graph_snake()
+    corridor_empty_count_snake()
     mm_find_best()
+    mm_find_best_in_place()
+    mm_find_best_voronoi()
+    mm_find_best_in_place_6()
+    mm_find_best_alpha_beta_6()
+    mm_find_best_alpha_beta_8()
+    best_reply_quality()
+    mcts_random_1000()
+    mcts_hug_1000()
+    for width, height in [(30, 20), (60, 40), (120, 80)]:
+        for benchmark in scaling(width, height):
+            benchmark()
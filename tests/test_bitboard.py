@@ -0,0 +1,120 @@
+"""
+Tests for the bitboard module.
+"""
+
+import random
+
+import pytest
+
+from bitboard import BitBoard, BitTronGrid
+from grid import TronGrid
+
+
+def random_grid(seed, walkers=4, steps=150):
+    """Grid with a few random walks on it."""
+    rnd = random.Random(seed)
+    tg = BitTronGrid()
+    offsets = tg.DIRECTIONS.values()
+    for i in xrange(walkers):
+        pos = tg.coords2index(rnd.randrange(30), rnd.randrange(20))
+        for j in xrange(steps):
+            if tg[pos] == 0:
+                tg[pos] = tg.body_of(i)
+            options = [pos + o for o in offsets if tg[pos + o] == 0]
+            if not options:
+                break
+            pos = rnd.choice(options)
+        tg[pos] = tg.head_of(i)
+    return tg
+
+
+def array_probe(tg, start_pos, limit=None):
+    """Probe using the array implementation."""
+    return TronGrid.bfs_probe(tg, start_pos, limit)
+
+
+def check_parity(tg, start_pos, limit=None):
+    """Compare the results of bitboard and array probes."""
+    exp = array_probe(tg, start_pos, limit)
+    res = tg.bfs_probe(start_pos, limit)
+
+    assert res.max_distance == exp.max_distance
+    assert res.empty_count == exp.empty_count
+    assert res.fillable == exp.fillable
+    assert res.obj2dist == exp.obj2dist
+    assert res.objects == exp.objects
+    assert res.closest_obstacle_d == exp.closest_obstacle_d
+    assert map(sorted, res.layers) == map(sorted, exp.layers)
+    for obj, pos in res.obj2pos.items():
+        assert tg[pos] == obj
+
+
+@pytest.fixture
+def btg():
+    return BitTronGrid()
+
+
+def test_reset(btg):
+    assert btg.bits.empty_count() == 600
+    assert btg.bits.masks[btg.body_of(0)] == 0
+
+
+def test_update(btg):
+    btg.put(3, 4, btg.body_of(1))
+    btg.vline(10, 5, 15, btg.body_of(2))
+
+    assert btg.bits.empty_count() == 600 - 12
+    btg.replace(btg.body_of(2), 0)
+    assert btg.bits.empty_count() == 599
+    assert btg.bits.masks[btg.body_of(2)] == 0
+
+    fresh = BitBoard()
+    fresh.reset(btg)
+    assert dict(fresh.masks) == {v: m for v, m in btg.bits.masks.items()
+            if m}
+
+
+def test_reachable(btg):
+    btg.vline(10, 0, 19, btg.body_of(0))
+
+    assert bin(btg.bits.reachable([0])).count('1') == 200
+    assert bin(btg.bits.reachable([0], limit=1)).count('1') == 3
+
+
+@pytest.mark.parametrize('x,y', [(15, 10), (0, 0), (29, 19), (29, 0)])
+def test_parity_empty(btg, x, y):
+    check_parity(btg, btg.coords2index(x, y))
+    check_parity(btg, btg.coords2index(x, y), limit=5)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_parity_random(seed):
+    tg = random_grid(seed)
+    rnd = random.Random(seed)
+    for i in xrange(10):
+        pos = tg.coords2index(rnd.randrange(30), rnd.randrange(20))
+        check_parity(tg, pos)
+        check_parity(tg, pos, limit=rnd.randrange(1, 20))
+
+
+def test_parity_board_size():
+    btg = BitTronGrid(width=70, height=30)
+    rnd = random.Random(5)
+    for i in xrange(300):
+        btg.put(rnd.randrange(70), rnd.randrange(30), rnd.randrange(1, 9))
+    assert btg.bits.empty_count() == btg.count_of(0)
+    for i in xrange(10):
+        pos = btg.coords2index(rnd.randrange(70), rnd.randrange(30))
+        check_parity(btg, pos)
+        check_parity(btg, pos, limit=rnd.randrange(1, 20))
+
+
+def test_get_pos_step(btg):
+    c2i = btg.coords2index
+    btg.vline(14, 0, 19, btg.body_of(0))
+
+    res = btg.bfs_probe(c2i(15, 10))
+
+    assert res.get_pos_step(c2i(16, 10)) == 1
+    assert res.get_pos_step(c2i(15, 12)) == 2
+    assert res.get_pos_step(c2i(1, 1)) is None
@@ -0,0 +1,66 @@
+"""
+Tests for the corridor module.
+"""
+
+import random
+
+import pytest
+
+from corridor import Degrees, corridor_graph
+from grid import TronGrid
+
+
+@pytest.fixture
+def tg():
+    return TronGrid()
+
+
+@pytest.fixture
+def tg_snake(tg):
+    """Field with the walls that leave one winding corridor."""
+    for y in xrange(1, 20, 2):
+        if y % 4 == 1:
+            tg.hline(y, 0, 28, 1)
+        else:
+            tg.hline(y, 1, 29, 1)
+    return tg
+
+
+def test_corridor_graph(tg_snake):
+    c2i = tg_snake.coords2index
+    graph = corridor_graph(tg_snake)
+
+    assert sorted(graph.nodes) == [c2i(0, 0), c2i(0, 19)]
+    assert len(graph.edges) == 1
+    assert graph.empty_count(c2i(0, 0)) == 309
+    assert graph.distances(c2i(0, 0)) == {c2i(0, 0): 0, c2i(0, 19): 309}
+    assert graph.fill_estimate(c2i(5, 0)) == 304
+
+    # Open a shortcut: now there are two junctions and a loop.
+    tg_snake.put(10, 1, 0)
+    graph = corridor_graph(tg_snake)
+    assert len(graph.nodes) == 4
+    assert graph.distances(c2i(10, 0))[c2i(0, 19)] == 261
+    assert graph.fill_estimate(c2i(10, 0)) == 299
+
+
+def test_corridor_graph_random(tg):
+    dtg = TronGrid()
+    tracker = dtg.add_tracker(Degrees())
+    rnd = random.Random(4)
+    for i in xrange(250):
+        dtg.put(rnd.randrange(30), rnd.randrange(20), rnd.choice([1, 1, 2]))
+    dtg.replace(2, 0)
+    degrees = Degrees()
+    degrees.reset(dtg)
+    assert degrees.degrees == tracker.degrees
+    graph = corridor_graph(dtg)
+    assert len(graph.nodes) + len(graph.cell2edge) == dtg.count_of(0)
+
+    for i in xrange(20):
+        pos = dtg.coords2index(rnd.randrange(30), rnd.randrange(20))
+        res = dtg.bfs_probe(pos)
+        assert graph.empty_count(pos) == res.empty_count
+        assert graph.fill_estimate(pos) <= res.empty_count
+        for node, dist in graph.distances(pos).items():
+            assert res.get_pos_step(node) == dist
@@ -0,0 +1,43 @@
+"""
+Tests for the distance field module.
+"""
+
+import random
+
+import pytest
+
+from distance_field import DistanceField
+from grid import TronGrid
+from test_grid import tg_box1
+
+
+@pytest.fixture
+def tg():
+    return TronGrid()
+
+
+def test_distance_field(tg_box1):
+    c2i = tg_box1.coords2index
+    field = tg_box1.add_tracker(DistanceField(c2i(15, 10)))
+    assert field.distance(c2i(18, 8)) == 5
+    assert field.distance(c2i(0, 0)) is None
+
+    tg_box1.hline(9, 10, 20, 1)
+    assert field.distance(c2i(15, 8)) == 14
+    tg_box1.put(5, 10, 0)
+    assert field.distance(c2i(0, 0)) == 25
+    field.move_source(tg_box1, c2i(16, 10))
+    assert field.distance(c2i(0, 0)) == 26
+
+
+def test_distance_field_random(tg):
+    rnd = random.Random(3)
+    source = tg.coords2index(15, 10)
+    field = tg.add_tracker(DistanceField(source))
+    for i in xrange(300):
+        pos = tg.coords2index(rnd.randrange(30), rnd.randrange(20))
+        if pos != source:
+            tg[pos] = rnd.choice([0, 0, 1, 2])
+        if i % 50 == 0:
+            tg.replace(2, 0)
+        assert field.marks == tg.bfs_probe(source).distances
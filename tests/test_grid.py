@@ -2,9 +2,12 @@
 Tests for the util module.
 """
 
+import random
+
 import pytest
 
-from grid import TronGrid
+from corridor import Degrees, corridor_graph
+from grid import MAX_PACKED_CELL, Components, RunLengths, TronGrid
 
 
 @pytest.fixture
@@ -14,7 +17,7 @@ def tg():
 
 @pytest.fixture
 def center():
-    return TronGrid.coords2index(15, 10)
+    return TronGrid().coords2index(15, 10)
 
 
 def test_constructor(tg):
@@ -129,6 +132,54 @@ def test_ray_probe_objs(tg, center):
     assert res.obj2pos[3] == tg.coords2index(25, 13)
 
 
+def slow_ray_probe(tg, start_pos, direction, width=0, limit=None):
+    """Ray probe that widens the cone with the float arithmetic."""
+    front = [start_pos]
+    open_directions = [dir for dir in tg.DIRECTIONS.values()
+            if dir != direction and dir != -direction]
+    steps = 0
+    add_pix = 0.0
+    empty_count = 0
+    obj2dist = {}
+    obj2pos = {}
+    layers = []
+    while front:
+        layers.append(front)
+        steps += 1
+        if limit is not None and steps > limit:
+            break
+        add_pix += width / 10.0
+        new_front = [pt + direction for pt in front]
+        if add_pix > 1:
+            add_pix -= 1
+            new_front = [new_front[0] + open_directions[0]] + new_front +\
+                        [new_front[-1] + open_directions[1]]
+        front = []
+        for pt in new_front:
+            value = tg[pt]
+            if value == 0:
+                front.append(pt)
+            elif value not in obj2dist:
+                obj2dist[value] = steps
+                obj2pos[value] = pt
+        empty_count += len(front)
+    return steps - 1, empty_count, obj2dist, obj2pos, layers
+
+
+def test_ray_probe_random(tg):
+    rnd = random.Random(1)
+    for i in xrange(150):
+        tg.put(rnd.randrange(30), rnd.randrange(20), rnd.randrange(1, 9))
+    for i in xrange(100):
+        pos = tg.coords2index(rnd.randrange(30), rnd.randrange(20))
+        width = rnd.randrange(11)
+        limit = rnd.choice([None, rnd.randrange(1, 20)])
+        for name, res in tg.ray_probe_all(pos, width, limit).items():
+            exp = slow_ray_probe(tg, pos, tg.DIRECTIONS[name], width, limit)
+            assert (res.max_distance, res.empty_count, res.obj2dist,
+                    res.obj2pos, res.layers) == exp
+
+
 @pytest.fixture
 def tg_box1(tg):
     """Field with the tail of tron #1 going around the middle."""
@@ -208,3 +259,363 @@ def test_bfs_probe_get_step(tg_box1):
     assert res.get_pos_step(right) == 2
     assert res.get_pos_step(up) == 3
     assert res.get_pos_step(out) is None
+
+
+def check_probe_many(tg, origins, limit=None):
+    results = tg.bfs_probe_many(origins, limit=limit)
+
+    assert len(results) == len(origins)
+    for pos, res in zip(origins, results):
+        exp = tg.bfs_probe(pos, limit=limit)
+        assert res.max_distance == exp.max_distance
+        assert res.empty_count == exp.empty_count
+        assert res.fillable == exp.fillable
+        assert res.obj2dist == exp.obj2dist
+        for obj, obj_pos in res.obj2pos.items():
+            assert tg[obj_pos] == obj
+
+
+def test_bfs_probe_many(tg_box1_in):
+    c2i = tg_box1_in.coords2index
+    origins = [c2i(15, 10), c2i(6, 7), c2i(0, 0), c2i(29, 19), c2i(5, 3)]
+
+    check_probe_many(tg_box1_in, origins)
+    check_probe_many(tg_box1_in, origins, limit=4)
+    check_probe_many(tg_box1_in, origins, limit=40)
+
+
+def test_bfs_probe_many_no_numpy(tg_box1, monkeypatch):
+    import grid
+    monkeypatch.setattr(grid, 'numpy', None)
+
+    check_probe_many(tg_box1, [tg_box1.coords2index(15, 10)], limit=3)
+
+
+@pytest.mark.parametrize('width,height', [(5, 3), (60, 40), (64, 9)])
+def test_board_size(width, height):
+    stg = TronGrid(indexed=True, width=width, height=height)
+    stg.add_tracker(Degrees())
+    c2i = stg.coords2index
+    corner = c2i(width - 1, height - 1)
+    assert stg.index2coords(corner) == (width - 1, height - 1)
+    assert stg.count_of(0) == width * height
+    for pos in (0, corner):
+        assert [stg[n] != 0 for n in stg.neighbours_of(pos)].count(True) == 2
+    assert stg.bfs_probe(0).empty_count == width * height - 1
+    assert stg.bfs_probe(0).max_distance == width + height - 2
+    res = stg.ray_probe(0, stg.DIRECTIONS['RIGHT'])
+    assert (res.max_distance, res.obj2dist) == (width - 1, {-1: width})
+
+    rnd = random.Random(width)
+    for i in xrange(width * height // 4):
+        stg.put(rnd.randrange(width), rnd.randrange(height), rnd.randrange(9))
+    origins = [c2i(rnd.randrange(width), rnd.randrange(height))
+            for i in xrange(5)]
+    check_probe_many(stg, origins)
+    check_probe_many(stg, origins, limit=3)
+    for pos in origins:
+        if stg[pos] == 0:
+            graph = corridor_graph(stg)
+            assert graph.empty_count(pos) == stg.bfs_probe(pos).empty_count
+        for name, res in stg.ray_probe_all(pos, 6).items():
+            exp = slow_ray_probe(stg, pos, stg.DIRECTIONS[name], 6)
+            assert (res.max_distance, res.empty_count, res.obj2dist,
+                    res.obj2pos, res.layers) == exp
+
+    data = stg.pack()
+    assert len(data) == (width * height + 1) // 2
+    utg = TronGrid.unpack(data, width=width, height=height)
+    assert utg.grid == stg.grid
+    assert str(utg) == str(stg)
+
+
+def test_apply_move_undo(tg, center):
+    tg[center] = tg.head_of(1)
+    before = tg.grid.tostring()
+
+    token = tg.apply_move(1, center + 1)
+    assert tg[center] == tg.body_of(1)
+    assert tg[center + 1] == tg.head_of(1)
+
+    token2 = tg.apply_move(1, center + 65)
+    tg.undo(token2)
+    tg.undo(token)
+    assert tg.grid.tostring() == before
+
+
+def test_apply_move_no_head(tg, center):
+    with pytest.raises(ValueError):
+        tg.apply_move(1, center)
+
+
+@pytest.fixture
+def itg():
+    return TronGrid(indexed=True)
+
+
+def test_cell_index(itg, center):
+    itg.vline(10, 5, 15, itg.body_of(1))
+    itg[center] = itg.head_of(1)
+    itg.put(3, 3, itg.body_of(2))
+
+    body = {itg.coords2index(10, y) for y in xrange(5, 16)}
+    assert itg.cells_of(itg.body_of(1)) == body
+    assert itg.count_of(itg.body_of(1)) == 11
+    assert itg.cells_of(itg.head_of(1)) == {center}
+    assert itg.count_of(itg.body_of(3)) == 0
+
+    itg.replace(itg.body_of(1), 0)
+    assert itg.count_of(itg.body_of(1)) == 0
+    assert itg.count_of(0) == 600 - 2
+    assert itg.get(10, 10) == 0
+
+    itg.replace(itg.body_of(2), itg.body_of(3))
+    assert itg.cells_of(itg.body_of(3)) == {itg.coords2index(3, 3)}
+
+
+def test_cell_index_unindexed(tg, center):
+    tg.vline(10, 5, 15, tg.body_of(1))
+
+    assert tg.count_of(tg.body_of(1)) == 11
+    assert tg.cells_of(tg.body_of(1)) == {tg.coords2index(10, y)
+            for y in xrange(5, 16)}
+
+
+def test_chambers_empty(tg, center):
+    root = tg.chambers(center)
+
+    assert root.entrance is None
+    assert root.size == 0
+    assert len(root.children) == 1
+    assert root.children[0].entrance == center
+    assert root.total == root.fillable == 599
+
+
+def test_chambers_rooms(tg, center):
+    """Two rooms on the sides of a corridor: only one can be filled."""
+    c2i = tg.coords2index
+    tg.vline(10, 0, 19, -1)
+    tg.vline(20, 0, 19, -1)
+    tg.hline(9, 11, 19, -1)
+    tg.hline(11, 11, 19, -1)
+    tg[c2i(10, 10)] = tg[c2i(20, 10)] = 0
+    tg[center] = tg.head_of(0)
+
+    root = tg.chambers(center)
+
+    assert root.total == 200 + 1 + 4 + 4 + 1 + 180
+    assert root.fillable == 4 + 1 + 200
+    assert len(root.children) == 2
+    sizes = sorted(chamber.fillable for chamber in root.children)
+    assert sizes == [4 + 1 + 180, 4 + 1 + 200]
+    assert root.total == tg.bfs_probe(center).empty_count
+
+
+def test_voronoi(tg):
+    c2i = tg.coords2index
+    heads = {0: c2i(5, 10), 1: c2i(24, 10)}
+    for player, pos in heads.items():
+        tg[pos] = tg.head_of(player)
+
+    res = tg.voronoi(heads)
+
+    assert res.counts == {0: 299, 1: 299}
+    assert res.ties == 0
+    assert res.owner[c2i(14, 0)] == 0
+    assert res.owner[c2i(15, 19)] == 1
+    assert c2i(14, 3) in res.frontier[0]
+    assert c2i(15, 3) in res.frontier[1]
+    assert c2i(13, 3) not in res.frontier[0]
+
+
+def test_voronoi_ties(tg):
+    c2i = tg.coords2index
+    heads = {0: c2i(5, 10), 2: c2i(25, 10)}
+
+    res = tg.voronoi(heads)
+
+    assert res.ties == 20
+    assert res.owner[c2i(15, 7)] is None
+    assert res.counts[0] == 10 * 20 + 5 * 20 - 1
+    assert res.counts[2] == 14 * 20 - 1
+    assert sum(res.counts.values()) + res.ties == 598
+
+
+def test_voronoi_limit(tg, center):
+    res = tg.voronoi({3: center}, limit=2)
+
+    assert res.counts == {3: 12}
+
+
+def test_bfs_probe_lean(tg_box1):
+    start = tg_box1.coords2index(15, 10)
+    full = tg_box1.bfs_probe(start, limit=10)
+
+    res = tg_box1.bfs_probe(start, limit=10, lean=True)
+
+    assert res.max_distance == full.max_distance
+    assert res.empty_count == full.empty_count
+    assert res.objects == set()
+    assert res.closest_obstacle_d is None
+    assert res.get_pos_step(start) is None
+
+
+def test_fillable(tg, center):
+    c2i = tg.coords2index
+    assert tg.fillable(center) == 599
+
+    # A 3x3 room with the start in the corner: 4 cells of the other colour
+    # and 4 of the same colour are all fillable.
+    tg.hline(3, 0, 3, 1)
+    tg.vline(3, 0, 2, 1)
+    assert tg.fillable(c2i(0, 0)) == 8
+    # From the middle of the side, 5 cells of the other colour can't all be
+    # visited.
+    assert tg.bfs_probe(c2i(1, 0)).empty_count == 8
+    assert tg.fillable(c2i(1, 0)) == 7
+    assert tg.fillable(c2i(1, 0), limit=1) == 1
+
+
+def test_bfs_probe_layers(tg_box1):
+    c2i = tg_box1.coords2index
+    res = tg_box1.bfs_probe(c2i(15, 10), limit=2)
+
+    assert res.layers == [[c2i(15, 10)],
+            sorted([c2i(15, 9), c2i(14, 10), c2i(16, 10), c2i(15, 11)]),
+            sorted([c2i(15, 8), c2i(14, 9), c2i(16, 9), c2i(13, 10),
+                c2i(17, 10), c2i(14, 11), c2i(16, 11), c2i(15, 12)])]
+
+
+def check_components(tg, comps):
+    """Compare the components with freshly computed ones."""
+    fresh = Components()
+    fresh.reset(tg)
+    comp2fresh = {}
+    for pos, comp in enumerate(comps.labels):
+        assert bool(comp) == bool(fresh.labels[pos])
+        if comp:
+            assert comp2fresh.setdefault(comp, fresh.labels[pos]) == \
+                    fresh.labels[pos]
+    assert len(set(comp2fresh.values())) == len(comp2fresh)
+    for comp, fresh_comp in comp2fresh.items():
+        assert comps.sizes[comp] == fresh.sizes[fresh_comp]
+    assert len(comps.sizes) == len(fresh.sizes)
+
+
+def test_components(tg, center):
+    comps = tg.add_tracker(Components())
+    c2i = tg.coords2index
+
+    assert comps.size_of(center) == 600
+    tg.vline(10, 0, 18, tg.body_of(0))
+    assert comps.size_of(center) == 600 - 19
+    tg.put(10, 19, tg.head_of(0))
+    assert comps.component_of(c2i(10, 19)) is None
+    assert comps.size_of(c2i(0, 0)) == 200
+    assert comps.size_of(center) == 380
+    assert not comps.connected(c2i(0, 0), center)
+    assert comps.connected(c2i(10, 19), center)
+    assert comps.space_around(c2i(10, 19)) == 580
+    check_components(tg, comps)
+
+    tg.put(10, 19, 0)
+    assert comps.size_of(center) == 581
+    check_components(tg, comps)
+
+    tg.replace(tg.body_of(0), 0)
+    assert comps.size_of(center) == 600
+    check_components(tg, comps)
+
+
+def test_components_random(tg):
+    comps = tg.add_tracker(Components())
+    rnd = random.Random(1)
+    for i in xrange(300):
+        pos = tg.coords2index(rnd.randrange(30), rnd.randrange(20))
+        tg[pos] = rnd.choice([0, 1, 1, 1, 5])
+        check_components(tg, comps)
+
+
+def test_components_not_copied(tg):
+    comps = tg.add_tracker(Components())
+
+    assert tg.copy().trackers == []
+    assert tg.trackers == [comps]
+
+
+def test_position_hash(center):
+    htg = TronGrid(hashed=True)
+    empty_hash = htg.position_hash()
+    assert empty_hash == TronGrid().position_hash()
+
+    htg[center] = htg.head_of(0)
+    htg.vline(3, 2, 8, htg.body_of(1))
+    assert htg.position_hash() != empty_hash
+    assert htg.position_hash() == TronGrid.position_hash(htg.copy())
+
+    token = htg.apply_move(0, center + 1)
+    moved_hash = htg.position_hash()
+    htg.undo(token)
+    assert htg.position_hash() != moved_hash
+
+    htg.replace(htg.body_of(1), 0)
+    htg[center] = 0
+    assert htg.position_hash() == empty_hash
+    assert htg.position_hash(0) != htg.position_hash(1)
+
+
+def test_position_hash_unhashed(tg, center):
+    tg[center] = 5
+    htg = TronGrid(hashed=True)
+    htg[center] = 5
+
+    assert tg.position_hash(2) == htg.position_hash(2)
+
+
+def test_pack(tg_box1):
+    tg_box1.put(0, 0, 8)
+    tg_box1.put(29, 19, -1)
+
+    data = tg_box1.pack()
+    assert len(data) == 300
+    assert TronGrid.unpack(data).grid == tg_box1.grid
+
+    tg_box1.put(1, 0, MAX_PACKED_CELL)
+    assert TronGrid.unpack(tg_box1.pack()).grid == tg_box1.grid
+    for value in MAX_PACKED_CELL + 1, 16, -2, 255, 271, -256:
+        tg_box1.put(1, 0, value)
+        with pytest.raises(ValueError):
+            tg_box1.pack()
+
+
+def test_unpack_trackers(tg_box1):
+    utg = TronGrid.unpack(tg_box1.pack(), indexed=True, hashed=True)
+
+    assert utg.cells_of(1) == tg_box1.cells_of(1)
+    assert utg.position_hash() == tg_box1.position_hash()
+    with pytest.raises(ValueError):
+        TronGrid.unpack('abc')
+
+
+def test_free_run(center):
+    rtg = TronGrid(run_lengths=True)
+    rnd = random.Random(2)
+    for i in xrange(200):
+        pos = rtg.coords2index(rnd.randrange(30), rnd.randrange(20))
+        rtg[pos] = rnd.choice([0, 1, 5])
+    rtg.replace(5, 0)
+    rtg[center] = 1
+    rtg[center] = 0
+
+    runs = RunLengths()
+    runs.reset(rtg)
+    assert runs.runs == rtg.run_lengths.runs
+    fresh = TronGrid()
+    fresh.grid = rtg.grid
+    for pos in [center] + [rtg.coords2index(rnd.randrange(30),
+            rnd.randrange(20)) for i in xrange(30)]:
+        for offset in rtg.DIRECTIONS.values():
+            run = rtg.free_run(pos, offset)
+            assert run == fresh.free_run(pos, offset)
+            assert run == rtg.ray_probe(pos, offset).max_distance
+    assert rtg.copy().free_run(center, 1) == rtg.free_run(center, 1)
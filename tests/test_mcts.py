@@ -0,0 +1,77 @@
+"""
+Tests for the mcts module.
+"""
+
+import mock
+import pytest
+
+from grid import TronGrid
+from mcts import MCTS
+
+
+@pytest.fixture
+def tg():
+    """Grid with two player heads, we are locked near the wall with the
+    other player."""
+    tg = TronGrid()
+    tg.put(2, 15, tg.head_of(1))
+    tg.put(0, 5, tg.head_of(2))
+    tg.vline(3, 0, 15, tg.body_of(1))
+    return tg
+
+
+@pytest.fixture
+def player():
+    """Player mock."""
+    return mock.Mock(x1=2, y1=15, number=1)
+
+
+def test_init(tg, player):
+    mcts = MCTS(tg, player)
+
+    assert mcts.order == [1, 2]
+    assert mcts.positions == [None, tg.coords2index(2, 15),
+            tg.coords2index(0, 5), None]
+
+
+@pytest.mark.parametrize('playout', ['random', 'hug'])
+def test_playouts(tg, player, playout):
+    cells = tg.grid[:]
+    mcts = MCTS(tg, player, playout=playout, seed=1)
+
+    reward, move = mcts.find_best_move(playouts=300)
+
+    assert mcts.playouts == 300
+    assert mcts.root.visits == 300
+    assert sum(child.visits for child in mcts.root.children) == 300
+    assert {child.direction for child in mcts.root.children} == \
+            {'LEFT', 'UP', 'DOWN'}
+    assert 0 <= reward <= 1
+    assert tg.grid == cells
+
+
+def test_trap():
+    """Going up leads into the dead end of two cells."""
+    tg = TronGrid()
+    tg.put(10, 10, tg.head_of(0))
+    tg.put(20, 10, tg.head_of(1))
+    tg.vline(9, 7, 10, tg.body_of(0))
+    tg.vline(11, 7, 10, tg.body_of(0))
+    tg.put(10, 7, tg.body_of(0))
+    mcts = MCTS(tg, mock.Mock(x1=10, y1=10, number=0), seed=1)
+
+    reward, move = mcts.find_best_move(playouts=300)
+    assert move == 'DOWN'
+    up, = [child for child in mcts.root.children if child.direction == 'UP']
+    assert up.reward == 0
+    assert up.visits < 30
+
+
+def test_dead_end(tg, player):
+    tg.put(1, 15, tg.body_of(2))
+    tg.put(2, 14, tg.body_of(2))
+    tg.put(2, 16, tg.body_of(2))
+
+    assert MCTS(tg, player).find_best_move(playouts=10) == (0, None)
+    with pytest.raises(ValueError):
+        MCTS(tg, player).find_best_move()
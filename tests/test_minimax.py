@@ -6,7 +6,7 @@ import pytest
 import mock
 
 from grid import TronGrid
-from minimax import MiniMax
+from minimax import INFINITY, MiniMax, TranspositionTable
 
 
 @pytest.fixture
@@ -77,6 +77,27 @@ def test_second_layer(tg, player):
                     nstate.player2pos[2]
 
 
+def test_state_grid(tg, player):
+    """Grids of the states are made from the moves."""
+    mm = MiniMax(tg, player)
+    for i in xrange(3):
+        mm.compute_next_layer()
+
+    assert mm.init_state.grid is tg
+    for state in mm.layers[-1]:
+        grid = tg.copy()
+        player2pos = mm.init_state.player2pos
+        for move in state.moves:
+            player2pos[move.player_number] += grid.DIRECTIONS[move.direction]
+            grid.apply_move(move.player_number,
+                    player2pos[move.player_number])
+        assert state.player2pos == player2pos
+        assert state.grid.grid == grid.grid
+        assert state.grid is not state.grid
+        assert not hasattr(state, '__dict__')
+    assert tg.count_of(0) == 598
+
+
 def test_catch(tg, player):
     """Test catching the other player."""
     tg.vline(3, 0, 15, tg.body_of(1))
@@ -84,3 +105,217 @@ def test_catch(tg, player):
 
     weight, move = mm.find_best_move(max_layers=3)
     assert move == 'LEFT'
+
+
+@pytest.mark.parametrize('max_layers,max_layer_size', [(1, 60), (3, 60),
+    (5, 60), (8, 10)])
+def test_in_place(tg, player, max_layers, max_layer_size):
+    """In-place search gives the same value and leaves the grid alone."""
+    tg.vline(3, 0, 15, tg.body_of(1))
+    before = tg.grid.tostring()
+
+    mm = MiniMax(tg.copy(), player)
+    weight, move = mm.find_best_move(max_layers=max_layers,
+            max_layer_size=max_layer_size)
+    mm_ip = MiniMax(tg, player, in_place=True)
+    weight_ip, move_ip = mm_ip.find_best_move(max_layers=max_layers,
+            max_layer_size=max_layer_size)
+
+    assert weight_ip == weight
+    assert tg.grid.tostring() == before
+    assert mm_ip.layers == []
+
+
+@pytest.mark.parametrize('max_layers,max_layer_size,guess', [(1, 60, None),
+    (3, 60, None), (5, 60, 0), (5, 1000, 80), (6, 1000, -90)])
+def test_alpha_beta(tg, player, max_layers, max_layer_size, guess):
+    """Alpha-beta search finds the same value visiting fewer positions."""
+    tg.vline(3, 0, 15, tg.body_of(1))
+    tg.hline(12, 10, 29, tg.body_of(2))
+    tg.put(20, 11, tg.head_of(3))
+    before = tg.grid.tostring()
+
+    mm = MiniMax(tg, player, in_place=True)
+    weight, move = mm.find_best_move(max_layers=max_layers,
+            max_layer_size=max_layer_size)
+    mm_ab = MiniMax(tg, player, alpha_beta=True)
+    weight_ab, move_ab = mm_ab.find_best_move(max_layers=max_layers,
+            max_layer_size=max_layer_size, guess=guess)
+
+    assert weight_ab == weight
+    assert tg.grid.tostring() == before
+    assert mm_ab.node_count <= mm.node_count
+    if max_layers > 3:
+        assert mm_ab.node_count < mm.node_count
+
+
+def test_iterative(tg, player):
+    """Iterative deepening gets as deep as the time allows."""
+    tg.vline(3, 0, 15, tg.body_of(1))
+    before = tg.grid.tostring()
+
+    mm = MiniMax(tg, player, in_place=True)
+    weight, move = mm.find_best_move(max_layers=5, max_layer_size=1000)
+    mm_id = MiniMax(tg, player)
+    weight_id, move_id = mm_id.find_best_move(max_layers=5,
+            time_limit=10000)
+    assert weight_id == weight
+    assert mm_id.completed_depth == 5
+
+    mm_short = MiniMax(tg, player)
+    weight_short, move_short = mm_short.find_best_move(max_layers=5,
+            time_limit=0.001)
+    assert mm_short.completed_depth == 1
+    assert weight_short == MiniMax(tg, player, alpha_beta=True)\
+            .find_best_move(max_layers=1)[0]
+    assert tg.grid.tostring() == before
+
+
+def test_iterative_max_nodes(tg, player):
+    """The node budget limits the depth, not the layer sizes."""
+    tg.vline(3, 0, 15, tg.body_of(1))
+
+    full = MiniMax(tg, player, alpha_beta=True)
+    weight, move = full.find_best_move(max_layers=6, max_layer_size=10 ** 6)
+    mm = MiniMax(tg, player)
+    assert mm.find_best_move(max_layers=6, max_nodes=10 ** 6)[0] == weight
+    assert mm.completed_depth == 6
+
+    mm_small = MiniMax(tg, player)
+    mm_small.find_best_move(max_layers=6, max_nodes=100)
+    assert 1 < mm_small.completed_depth < 6
+    assert mm_small.node_count <= 101
+    assert mm_small.node_limit is None
+
+
+def test_iterative_dead_end(tg, player):
+    """Iterative deepening stops when every line has ended."""
+    tg.put(0, 5, 0)
+    tg.vline(1, 0, 19, tg.body_of(2))
+    tg.vline(3, 0, 19, tg.body_of(1))
+    tg.put(2, 5, tg.head_of(2))
+
+    mm = MiniMax(tg, player)
+    weight, move = mm.find_best_move(max_layers=30, time_limit=10000)
+    assert mm.completed_depth < 30
+    assert move is not None
+
+
+def test_transposition_table():
+    table = TranspositionTable(size=8)
+    table.put(3, 2, 10, table.EXACT, 'UP')
+    table.put(11, 1, 20, table.LOWER)  # Same slot, shallower.
+    assert table.get(11) is None
+    assert table.get(3)[1:5] == (2, 10, table.EXACT, 'UP')
+    table.put(11, 4, 30, table.UPPER)
+    assert table.get(3) is None
+    assert table.get(11)[1:4] == (4, 30, table.UPPER)
+    table.new_generation()
+    table.put(19, 0, 40, table.EXACT)
+    assert table.get(19)[2] == 40
+    assert len(table.slots) == 8
+
+
+def test_table(player):
+    """Searches with the table find the same values and reuse them."""
+    htg = TronGrid(hashed=True)
+    htg.put(2, 15, htg.head_of(1))
+    htg.put(0, 5, htg.head_of(2))
+    htg.vline(3, 0, 15, htg.body_of(1))
+    table = TranspositionTable()
+
+    weight, move = MiniMax(htg, player, alpha_beta=True).find_best_move(
+            max_layers=5, max_layer_size=1000)
+    mm = MiniMax(htg, player, alpha_beta=True, table=table)
+    assert mm.find_best_move(max_layers=5, max_layer_size=1000)[0] == weight
+    mm_again = MiniMax(htg, player, alpha_beta=True, table=table)
+    assert mm_again.find_best_move(max_layers=5,
+            max_layer_size=1000)[0] == weight
+    assert mm_again.node_count < mm.node_count
+
+    mm_id = MiniMax(htg, player, table=table)
+    assert mm_id.find_best_move(max_layers=5, time_limit=10000)[0] == weight
+
+    layered_weight = MiniMax(htg.copy(), player, table=table).find_best_move(
+            max_layers=3)[0]
+    layered = MiniMax(htg.copy(), player, table=table)
+    layered.evaluate = mock.Mock(side_effect=AssertionError)
+    assert layered.find_best_move(max_layers=3)[0] == layered_weight
+
+    with pytest.raises(ValueError):
+        MiniMax(TronGrid(), player, table=table)
+
+
+def test_best_reply(tg, player):
+    """Only one opponent moves on the plies of the opponents."""
+    tg.put(20, 5, tg.head_of(0))
+    tg.put(20, 15, tg.head_of(3))
+    player2pos = {number: tg.coords2index(*coords) for number, coords in
+            [(0, (20, 5)), (1, (2, 15)), (2, (0, 5)), (3, (20, 15))]}
+    mm = MiniMax(tg, player, best_reply=True)
+
+    assert mm.next_player_after(1) == 0
+    assert mm.next_player_after(0) == 1
+    assert mm.count_states(1, player2pos, 2) == 4 * (4 + 3 + 4)
+    assert MiniMax(tg, player).count_states(1, player2pos, 2) == 4 * 3
+
+    weight = mm.find_best_move(max_layers=3)[0]
+    assert map(len, mm.layers) == [4, 44, 44 * 3]
+    for name in 'in_place', 'alpha_beta':
+        mm = MiniMax(tg, player, best_reply=True, **{name: True})
+        assert mm.find_best_move(max_layers=3)[0] == weight
+
+
+def test_iterative_table(player):
+    """Cut-offs by the table entries don't stop the deepening."""
+    htg = TronGrid(hashed=True)
+    htg.put(2, 15, htg.head_of(1))
+    htg.put(0, 5, htg.head_of(2))
+    htg.vline(3, 0, 15, htg.body_of(1))
+    cold = MiniMax(htg, player, table=TranspositionTable())
+    expected = cold.find_best_move(max_layers=6, time_limit=10000)
+
+    # Exact values of all the moves from the search on the last turn.
+    table = TranspositionTable()
+    mm = MiniMax(htg, player, alpha_beta=True, table=table)
+    mm.killers = [[] for i in xrange(6)]
+    player2pos = dict(mm.init_state.player2pos)
+    for dir, new_pos in mm.moves_of(1, player2pos):
+        token = mm.make_move(1, new_pos, player2pos)
+        mm.search_alpha_beta(2, player2pos, 5, -INFINITY, INFINITY, 1)
+        mm.unmake_move(1, token, player2pos)
+
+    warm = MiniMax(htg, player, table=table)
+    assert warm.find_best_move(max_layers=6, time_limit=10000) == expected
+    assert warm.completed_depth == cold.completed_depth == 6
+
+
+def test_catch_in_place(tg, player):
+    """Test catching the other player with in-place search."""
+    tg.vline(3, 0, 15, tg.body_of(1))
+    mm = MiniMax(tg, player, in_place=True)
+
+    weight, move = mm.find_best_move(max_layers=3)
+    assert move == 'LEFT'
+
+
+def test_voronoi(tg, player):
+    """Voronoi evaluation sees that the opponent is locked near the wall."""
+    tg.vline(3, 0, 15, tg.body_of(1))
+    mm = MiniMax(tg.copy(), player, evaluation='voronoi')
+    mm_ip = MiniMax(tg, player, in_place=True, evaluation='voronoi')
+
+    weight, move = mm.find_best_move(max_layers=3)
+    weight_ip, move_ip = mm_ip.find_best_move(max_layers=3)
+
+    assert weight == weight_ip
+    assert weight > 70
+
+
+def test_fillable(tg, player):
+    """Parity-corrected evaluation also catches the other player."""
+    tg.vline(3, 0, 15, tg.body_of(1))
+    mm = MiniMax(tg, player, in_place=True, evaluation='fillable')
+
+    weight, move = mm.find_best_move(max_layers=3)
+    assert move == 'LEFT'
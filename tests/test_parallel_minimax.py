@@ -0,0 +1,48 @@
+"""
+Tests for the parallel minimax module.
+"""
+
+import multiprocessing
+
+import mock
+import pytest
+
+from grid import TronGrid
+from minimax import MiniMax
+from parallel_minimax import ParallelMiniMax
+
+
+@pytest.fixture(scope='module')
+def pool():
+    pool = multiprocessing.Pool(2)
+    yield pool
+    pool.close()
+    pool.join()
+
+
+@pytest.mark.parametrize('alpha_beta', [False, True])
+def test_same_as_one_process(pool, alpha_beta):
+    tg = TronGrid()
+    tg.put(2, 15, tg.head_of(1))
+    tg.put(0, 5, tg.head_of(2))
+    tg.vline(3, 0, 15, tg.body_of(1))
+    player = mock.Mock(x1=2, y1=15, number=1)
+
+    mm = MiniMax(tg, player, in_place=True)
+    pmm = ParallelMiniMax(tg, player, pool, alpha_beta=alpha_beta)
+
+    assert pmm.find_best_move(max_layers=4) == mm.find_best_move(
+            max_layers=4)
+    if not alpha_beta:
+        assert pmm.node_count == mm.node_count  # Same positions.
+    assert tg.count_of(0) == 600 - 18
+
+
+def test_no_moves(pool):
+    tg = TronGrid()
+    tg.put(0, 0, tg.head_of(0))
+    tg.put(1, 0, tg.body_of(1))
+    tg.put(0, 1, tg.head_of(1))
+    player = mock.Mock(x1=0, y1=0, number=0)
+
+    assert ParallelMiniMax(tg, player, pool).find_best_move() == (-100, None)
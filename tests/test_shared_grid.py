@@ -0,0 +1,82 @@
+"""
+Tests for the shared grid module.
+"""
+
+import multiprocessing
+import pickle
+
+import pytest
+
+from grid import TronGrid
+from shared_grid import SharedTronGrid, attach
+
+
+def probe_empty_count(grid, pos):
+    return grid.bfs_probe(pos).empty_count
+
+
+@pytest.fixture
+def stg(tmpdir):
+    return SharedTronGrid(indexed=True, path=str(tmpdir.join('grid')))
+
+
+def test_shared(stg):
+    view = attach(stg.path)
+    stg.put(3, 4, stg.head_of(0))
+    stg.vline(10, 0, 19, stg.body_of(0))
+
+    assert view.get(3, 4) == stg.head_of(0)
+    assert view.count_of(stg.body_of(0)) == 20
+    assert view.pack() == stg.pack()
+    assert str(view) == str(stg)
+    assert probe_empty_count(view, 0) == 198
+
+
+def test_board_size(tmpdir):
+    stg = SharedTronGrid(width=80, height=50, path=str(tmpdir.join('grid')))
+    stg.put(79, 49, stg.head_of(0))
+    view = pickle.loads(pickle.dumps(stg, 2))
+
+    assert (view.width, view.height) == (80, 50)
+    assert view.get(79, 49) == stg.head_of(0)
+    assert view.copy().grid == stg.cells()
+    assert probe_empty_count(view, 0) == 80 * 50 - 2
+
+
+def test_read_only(stg):
+    view = stg.view()
+    with pytest.raises(TypeError):
+        view.put(1, 1, 1)
+    with pytest.raises(TypeError):
+        view.replace(0, 1)
+
+    private = view.copy()
+    private.put(1, 1, 1)
+    assert type(private) == TronGrid
+    assert stg.get(1, 1) == 0
+    assert stg.copy().cells_of(1) == set()
+
+
+def test_workers(stg):
+    pool = multiprocessing.Pool(2)
+    try:
+        pos = stg.coords2index(15, 10)
+        assert pool.apply(probe_empty_count, (stg, pos)) == 599
+        stg.vline(10, 0, 19, stg.body_of(0))
+        assert pool.apply(probe_empty_count, (stg, pos)) == 379
+    finally:
+        pool.terminate()
+
+
+def test_fork():
+    stg = SharedTronGrid()
+    view = stg.view()
+    queue = multiprocessing.Queue()
+    worker = multiprocessing.Process(target=lambda: queue.put(view.pack()))
+    stg.put(5, 5, 1)
+    worker.start()
+    assert queue.get(timeout=5) == stg.pack()
+    worker.join()
+
+    with pytest.raises(TypeError):
+        multiprocessing.Pool(1).apply(probe_empty_count, (stg, 0))
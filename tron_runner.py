@@ -6,6 +6,7 @@ import time
 import argparse
 
 from curses_renderer import CursesRenderer
+from grid import HEIGHT, WIDTH
 from server import TronServer
 
 
@@ -102,7 +103,11 @@ if __name__ == '__main__':
     parser.add_argument('--players-file', '-p', type=str,
             default='players.conf', metavar='PLAYERS',
             help='File with players configuration.')
+    parser.add_argument('--board', '-b', type=str,
+            default='{}x{}'.format(WIDTH, HEIGHT),
+            metavar='WxH', help='Size of the board.')
     config = parser.parse_args()
+    width, height = map(int, config.board.split('x'))
 
     if config.games_number == 1:
         renderer = CursesRenderer()
@@ -110,7 +115,7 @@ if __name__ == '__main__':
         renderer = MultigameRenderer()
         config.framerate = None
 
-    server = TronServer()
+    server = TronServer(width, height)
     with renderer as renderer:
         runner = TronRunner(server, renderer, config)
         runner.run()